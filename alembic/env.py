@@ -9,7 +9,10 @@ import sys
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 from app.database import Base
-from app.models import user, company, complaint, reply, image, chat
+from app.models import (
+    user, company, complaint, complaints_history, reply, image, chat, organization,
+    score_history, scheduler_lease, feed, engagement, search, trending
+)
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -0,0 +1,37 @@
+"""Organization stats counters
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-17 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The app's create_all may already have created the table on startup
+    if not sa.inspect(op.get_bind()).has_table("organization_counters"):
+        op.create_table(
+            "organization_counters",
+            sa.Column("organization_id", sa.Integer(), nullable=False),
+            sa.Column("complaints_total", sa.Integer(), nullable=False),
+            sa.Column("resolved", sa.Integer(), nullable=False),
+            sa.Column("reimbursed", sa.Integer(), nullable=False),
+            sa.Column("unresolved", sa.Integer(), nullable=False),
+            sa.Column("unresolved_created_sum", sa.BigInteger(), nullable=False),
+            sa.Column("chats", sa.Integer(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint("organization_id"),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("organization_counters")
@@ -0,0 +1,48 @@
+"""Organization score history
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The app's create_all may already have created the tables on startup
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("score_samples"):
+        op.create_table(
+            "score_samples",
+            sa.Column("id", sa.BigInteger().with_variant(sa.Integer(), "sqlite"), autoincrement=True, nullable=False),
+            sa.Column("organization_id", sa.Integer(), nullable=False),
+            sa.Column("sampled_at", sa.DateTime(), nullable=False),
+            sa.Column("score", sa.Float(), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index("ix_score_samples_org_sampled", "score_samples", ["organization_id", "sampled_at"])
+    
+    if not inspector.has_table("score_rollups"):
+        op.create_table(
+            "score_rollups",
+            sa.Column("organization_id", sa.Integer(), nullable=False),
+            sa.Column("resolution", sa.String(length=8), nullable=False),
+            sa.Column("bucket_start", sa.DateTime(), nullable=False),
+            sa.Column("score_sum", sa.Float(), nullable=False),
+            sa.Column("samples", sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint("organization_id", "resolution", "bucket_start"),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("score_rollups")
+    op.drop_index("ix_score_samples_org_sampled", table_name="score_samples")
+    op.drop_table("score_samples")
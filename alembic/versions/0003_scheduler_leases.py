@@ -0,0 +1,33 @@
+"""Scheduler leases
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # DatabaseLease creates the table itself when it is missing
+    if not sa.inspect(op.get_bind()).has_table("scheduler_leases"):
+        op.create_table(
+            "scheduler_leases",
+            sa.Column("name", sa.String(length=64), nullable=False),
+            sa.Column("holder", sa.String(length=255), nullable=False),
+            sa.Column("expires_at", sa.DateTime(), nullable=False),
+            sa.Column("last_run_at", sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint("name"),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("scheduler_leases")
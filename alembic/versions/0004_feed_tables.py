@@ -0,0 +1,51 @@
+"""Organization followers and materialized feeds
+
+Fill them with python -m app.utils.feed after upgrading.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The app's create_all may already have created the tables on startup
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("organization_followers"):
+        op.create_table(
+            "organization_followers",
+            sa.Column("organization_id", sa.Integer(), nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint("organization_id", "user_id"),
+        )
+        op.create_index("ix_organization_followers_user", "organization_followers", ["user_id"])
+    
+    if not inspector.has_table("feed_entries"):
+        op.create_table(
+            "feed_entries",
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("complaint_id", sa.Integer(), nullable=False),
+            sa.Column("company_id", sa.Integer(), nullable=False),
+            sa.Column("created", sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint("user_id", "complaint_id"),
+        )
+        op.create_index("ix_feed_entries_user_created", "feed_entries", ["user_id", "created", "complaint_id"])
+        op.create_index("ix_feed_entries_complaint", "feed_entries", ["complaint_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_feed_entries_complaint", table_name="feed_entries")
+    op.drop_index("ix_feed_entries_user_created", table_name="feed_entries")
+    op.drop_table("feed_entries")
+    op.drop_index("ix_organization_followers_user", table_name="organization_followers")
+    op.drop_table("organization_followers")
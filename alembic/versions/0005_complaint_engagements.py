@@ -0,0 +1,48 @@
+"""Complaint engagement rows and counters
+
+Move the legacy views/shares lists over with python -m app.utils.engagement
+after upgrading.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+ENGAGEMENT_COUNTERS = ["views_count", "facebook_shares_count", "twitter_shares_count", "speaks_shares_count"]
+
+
+def upgrade() -> None:
+    # The app's create_all may already have created the table and columns on startup
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("complaint_engagements"):
+        op.create_table(
+            "complaint_engagements",
+            sa.Column("complaint_id", sa.Integer(), nullable=False),
+            sa.Column("kind", sa.String(length=16), nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint("complaint_id", "kind", "user_id"),
+        )
+    
+    existing = {column["name"] for column in inspector.get_columns("complaints")}
+    with op.batch_alter_table("complaints") as batch_op:
+        for column in ENGAGEMENT_COUNTERS:
+            if column not in existing:
+                batch_op.add_column(sa.Column(column, sa.Integer(), nullable=False, server_default="0"))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("complaints") as batch_op:
+        for column in reversed(ENGAGEMENT_COUNTERS):
+            batch_op.drop_column(column)
+    op.drop_table("complaint_engagements")
@@ -0,0 +1,49 @@
+"""Inverted index for complaint search
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 00:00:00
+
+Fill it with python -m app.utils.search after upgrading.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    
+    if not inspector.has_table("complaint_terms"):
+        op.create_table(
+            "complaint_terms",
+            sa.Column("term", sa.String(length=64), nullable=False),
+            sa.Column("complaint_id", sa.Integer(), nullable=False),
+            sa.Column("company_id", sa.Integer(), nullable=False),
+            sa.Column("weight", sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint("term", "complaint_id"),
+        )
+        op.create_index("ix_complaint_terms_term_company", "complaint_terms", ["term", "company_id", "complaint_id"])
+        op.create_index("ix_complaint_terms_complaint", "complaint_terms", ["complaint_id"])
+    
+    if not inspector.has_table("search_terms"):
+        op.create_table(
+            "search_terms",
+            sa.Column("term", sa.String(length=64), nullable=False),
+            sa.Column("documents", sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint("term"),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("search_terms")
+    op.drop_index("ix_complaint_terms_complaint", table_name="complaint_terms")
+    op.drop_index("ix_complaint_terms_term_company", table_name="complaint_terms")
+    op.drop_table("complaint_terms")
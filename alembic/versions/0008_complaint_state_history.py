@@ -0,0 +1,72 @@
+"""Complaint state transitions and timing summaries
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 00:00:00
+
+Add the timing rows of existing complaints with
+python -m app.utils.state_history after upgrading.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+HISTORY_COLUMNS = [
+    ("from_state", sa.String(length=16)),
+    ("to_state", sa.String(length=16)),
+    ("changed_by", sa.Integer()),
+]
+
+TIMING_INDEXES = [
+    ("ix_complaint_timings_company_open", ["company_id", "seconds_to_open"]),
+    ("ix_complaint_timings_company_respond", ["company_id", "seconds_to_respond"]),
+    ("ix_complaint_timings_company_resolve", ["company_id", "seconds_to_resolve"]),
+]
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    
+    existing = {column["name"] for column in inspector.get_columns("complaints_history")}
+    with op.batch_alter_table("complaints_history") as batch_op:
+        for name, type_ in HISTORY_COLUMNS:
+            if name not in existing:
+                batch_op.add_column(sa.Column(name, type_, nullable=True))
+    if not any(index["name"] == "ix_complaints_history_complaint_date" for index in inspector.get_indexes("complaints_history")):
+        op.create_index("ix_complaints_history_complaint_date", "complaints_history", ["complaint_id", "date"])
+    
+    if not inspector.has_table("complaint_timings"):
+        op.create_table(
+            "complaint_timings",
+            sa.Column("complaint_id", sa.Integer(), nullable=False),
+            sa.Column("company_id", sa.Integer(), nullable=False),
+            sa.Column("created", sa.DateTime(), nullable=True),
+            sa.Column("opened_at", sa.DateTime(), nullable=True),
+            sa.Column("responded_at", sa.DateTime(), nullable=True),
+            sa.Column("resolved_at", sa.DateTime(), nullable=True),
+            sa.Column("seconds_to_open", sa.Integer(), nullable=True),
+            sa.Column("seconds_to_respond", sa.Integer(), nullable=True),
+            sa.Column("seconds_to_resolve", sa.Integer(), nullable=True),
+            sa.PrimaryKeyConstraint("complaint_id"),
+        )
+        for name, columns in TIMING_INDEXES:
+            op.create_index(name, "complaint_timings", columns)
+
+
+def downgrade() -> None:
+    for name, _ in reversed(TIMING_INDEXES):
+        op.drop_index(name, table_name="complaint_timings")
+    op.drop_table("complaint_timings")
+    
+    op.drop_index("ix_complaints_history_complaint_date", table_name="complaints_history")
+    with op.batch_alter_table("complaints_history") as batch_op:
+        for name, _ in reversed(HISTORY_COLUMNS):
+            batch_op.drop_column(name)
@@ -0,0 +1,114 @@
+"""Chat inbox previews and unread counters
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17 00:00:00
+
+Existing chats get their last message copied from chat_messages; the
+unread counters of chats with messages that are flagged unread start at 1,
+since only the flags were stored before.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+
+CHAT_COLUMNS = [
+    ("last_message_id", sa.Integer(), {}),
+    ("last_message_preview", sa.String(length=255), {}),
+    ("last_message_from_admin", sa.Boolean(), {}),
+    ("unread_by_user", sa.Integer(), {"nullable": False, "server_default": "0"}),
+]
+
+CHAT_COMPANY_COLUMNS = [
+    ("last_message_date", sa.DateTime(6), {}),
+    ("unread_by_admin", sa.Integer(), {"nullable": False, "server_default": "0"}),
+]
+
+PREVIEW_LENGTH = 140
+
+
+def _add_columns(inspector, table, columns):
+    existing = {column["name"] for column in inspector.get_columns(table)}
+    with op.batch_alter_table(table) as batch_op:
+        for name, type_, options in columns:
+            if name not in existing:
+                batch_op.add_column(sa.Column(name, type_, **options))
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    _add_columns(inspector, "chats", CHAT_COLUMNS)
+    _add_columns(inspector, "chat_companies", CHAT_COMPANY_COLUMNS)
+    if not any(index["name"] == "ix_chat_companies_company_last_message" for index in inspector.get_indexes("chat_companies")):
+        op.create_index(
+            "ix_chat_companies_company_last_message", "chat_companies", ["company_id", "last_message_date", "chat_id"]
+        )
+    
+    chats = sa.table(
+        "chats",
+        sa.column("id"), sa.column("last_message_date"), sa.column("is_read_by_user"),
+        sa.column("last_message_id"), sa.column("last_message_preview"),
+        sa.column("last_message_from_admin"), sa.column("unread_by_user"),
+    )
+    messages = sa.table(
+        "chat_messages",
+        sa.column("id"), sa.column("chat_id"), sa.column("sent_date"),
+        sa.column("admin_user_id"), sa.column("message"),
+    )
+    chat_companies = sa.table(
+        "chat_companies",
+        sa.column("chat_id"), sa.column("is_read_by_admin"),
+        sa.column("last_message_date"), sa.column("unread_by_admin"),
+    )
+    
+    # Last message of every chat, by the (chat_id, sent_date, id) index
+    last_message_id = sa.select(messages.c.id).where(messages.c.chat_id == chats.c.id).order_by(
+        messages.c.sent_date.desc(), messages.c.id.desc()
+    ).limit(1).scalar_subquery()
+    op.execute(chats.update().values(last_message_id=last_message_id))
+    
+    last_message = messages.alias("last_message")
+    
+    def from_last_message(column):
+        return sa.select(column).where(last_message.c.id == chats.c.last_message_id).scalar_subquery()
+    
+    op.execute(chats.update().where(chats.c.last_message_id.isnot(None)).values(
+        last_message_date=from_last_message(last_message.c.sent_date),
+        last_message_preview=from_last_message(sa.func.substr(last_message.c.message, 1, PREVIEW_LENGTH)),
+        last_message_from_admin=from_last_message(last_message.c.admin_user_id.isnot(None)),
+    ))
+    op.execute(chats.update().values(
+        unread_by_user=sa.case(
+            (sa.or_(chats.c.is_read_by_user == sa.true(), chats.c.last_message_id.is_(None)), 0), else_=1
+        )
+    ))
+    op.execute(chat_companies.update().values(
+        last_message_date=sa.select(chats.c.last_message_date).where(
+            chats.c.id == chat_companies.c.chat_id,
+            chats.c.last_message_id.isnot(None)
+        ).scalar_subquery()
+    ))
+    op.execute(chat_companies.update().values(
+        unread_by_admin=sa.case(
+            (sa.or_(chat_companies.c.is_read_by_admin == sa.true(), chat_companies.c.last_message_date.is_(None)), 0),
+            else_=1
+        )
+    ))
+
+
+def downgrade() -> None:
+    op.drop_index("ix_chat_companies_company_last_message", table_name="chat_companies")
+    with op.batch_alter_table("chat_companies") as batch_op:
+        for name, _, _ in reversed(CHAT_COMPANY_COLUMNS):
+            batch_op.drop_column(name)
+    with op.batch_alter_table("chats") as batch_op:
+        for name, _, _ in reversed(CHAT_COLUMNS):
+            batch_op.drop_column(name)
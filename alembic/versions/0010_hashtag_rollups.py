@@ -0,0 +1,37 @@
+"""Per-bucket hashtag rollups for trending hashtags
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-17 00:00:00
+
+Trending counts start from the complaints created after the upgrade; the
+longest window is a week, so they are complete a week later.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("hashtag_rollups"):
+        op.create_table(
+            "hashtag_rollups",
+            sa.Column("bucket_seconds", sa.Integer(), nullable=False),
+            sa.Column("bucket", sa.Integer(), nullable=False),
+            sa.Column("organization_id", sa.Integer(), nullable=False),
+            sa.Column("hashtag", sa.String(length=100), nullable=False),
+            sa.Column("count", sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint("bucket_seconds", "bucket", "organization_id", "hashtag"),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("hashtag_rollups")
@@ -0,0 +1,39 @@
+"""Feed size bounds for capping feeds at write time
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-17 00:00:00
+
+The bounds start from the current length of every feed.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0011'
+down_revision = '0010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("feed_sizes"):
+        op.create_table(
+            "feed_sizes",
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("entries", sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint("user_id"),
+        )
+        feed_entries = sa.table("feed_entries", sa.column("user_id"))
+        feed_sizes = sa.table("feed_sizes", sa.column("user_id"), sa.column("entries"))
+        op.execute(feed_sizes.insert().from_select(
+            ["user_id", "entries"],
+            sa.select(feed_entries.c.user_id, sa.func.count()).group_by(feed_entries.c.user_id)
+        ))
+
+
+def downgrade() -> None:
+    op.drop_table("feed_sizes")
@@ -0,0 +1,31 @@
+"""Batch token on complaints for multi-row bulk ingestion
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-17 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0012'
+down_revision = '0011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if not any(column["name"] == "ingest_batch" for column in inspector.get_columns("complaints")):
+        with op.batch_alter_table("complaints") as batch_op:
+            batch_op.add_column(sa.Column("ingest_batch", sa.String(length=32), nullable=True))
+    if not any(index["name"] == "ix_complaints_ingest_batch" for index in inspector.get_indexes("complaints")):
+        op.create_index("ix_complaints_ingest_batch", "complaints", ["ingest_batch"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_complaints_ingest_batch", table_name="complaints")
+    with op.batch_alter_table("complaints") as batch_op:
+        batch_op.drop_column("ingest_batch")
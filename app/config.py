@@ -38,5 +38,54 @@ class Settings:
     # App
     BASE_URL: str = config("BASE_URL", default="http://localhost:8000")
     ENVIRONMENT: str = config("ENVIRONMENT", default="development")
+    
+    # Stats scheduler
+    STATS_EXECUTOR: str = config("STATS_EXECUTOR", default="thread")  # thread or process
+    STATS_WORKERS: int = config("STATS_WORKERS", default=4, cast=int)
+    STATS_BATCH_SIZE: int = config("STATS_BATCH_SIZE", default=500, cast=int)
+    SCORE_SAMPLE_RETENTION_DAYS: int = config("SCORE_SAMPLE_RETENTION_DAYS", default=90, cast=int)
+    CRISIS_THRESHOLD_TTL: int = config("CRISIS_THRESHOLD_TTL", default=300, cast=int)  # seconds
+    CRISIS_FEED_TTL: int = config("CRISIS_FEED_TTL", default=60, cast=int)  # seconds
+    COMPANY_STATS_TTL: int = config("COMPANY_STATS_TTL", default=60, cast=int)  # seconds
+    COMPANY_STATS_MAX_ENTRIES: int = config("COMPANY_STATS_MAX_ENTRIES", default=10000, cast=int)
+    SCHEDULER_INTERVAL: int = config("SCHEDULER_INTERVAL", default=3600, cast=int)  # seconds
+    SCHEDULER_JITTER: int = config("SCHEDULER_JITTER", default=300, cast=int)  # seconds
+    SCHEDULER_LOCK: str = config("SCHEDULER_LOCK", default="database")  # database or file
+    SCHEDULER_LOCK_DIR: str = config("SCHEDULER_LOCK_DIR", default="/tmp")
+    SCHEDULER_LEASE_TTL: int = config("SCHEDULER_LEASE_TTL", default=120, cast=int)  # seconds
+    
+    # Feed
+    FEED_MAX_ENTRIES: int = config("FEED_MAX_ENTRIES", default=500, cast=int)
+    FEED_FANOUT_MAX_FOLLOWERS: int = config("FEED_FANOUT_MAX_FOLLOWERS", default=10000, cast=int)
+    FEED_FANOUT_BATCH_SIZE: int = config("FEED_FANOUT_BATCH_SIZE", default=500, cast=int)  # entries written in the request
+    FEED_HOT_ORGS_TTL: int = config("FEED_HOT_ORGS_TTL", default=600, cast=int)  # seconds
+    
+    # Search
+    SEARCH_DOCUMENT_COUNT_TTL: int = config("SEARCH_DOCUMENT_COUNT_TTL", default=600, cast=int)  # seconds
+    
+    # Trending hashtags
+    TRENDING_MAX_TAGS: int = config("TRENDING_MAX_TAGS", default=1000, cast=int)  # per time bucket
+    TRENDING_MAX_ORGANIZATIONS: int = config("TRENDING_MAX_ORGANIZATIONS", default=1000, cast=int)
+    TRENDING_SYNC_INTERVAL: int = config("TRENDING_SYNC_INTERVAL", default=600, cast=int)  # seconds
+    
+    # Bulk complaint ingestion
+    BULK_INGEST_CHUNK_SIZE: int = config("BULK_INGEST_CHUNK_SIZE", default=500, cast=int)
+    BULK_INGEST_MAX_ITEMS: int = config("BULK_INGEST_MAX_ITEMS", default=10000, cast=int)
+    BULK_INGEST_MAX_LINES: int = config("BULK_INGEST_MAX_LINES", default=100000, cast=int)  # per NDJSON body
+    
+    # Real-time chat
+    CHAT_BROKER: str = config("CHAT_BROKER", default="memory")  # memory or redis
+    CHAT_BROKER_URL: str = config("CHAT_BROKER_URL", default="redis://localhost:6379/0")
+    CHAT_SUBSCRIBER_QUEUE_SIZE: int = config("CHAT_SUBSCRIBER_QUEUE_SIZE", default=100, cast=int)
+    
+    # Complaint exports
+    EXPORT_CHUNK_SIZE: int = config("EXPORT_CHUNK_SIZE", default=1000, cast=int)
+    
+    # Views and shares write-behind buffer
+    ENGAGEMENT_QUEUE_SIZE: int = config("ENGAGEMENT_QUEUE_SIZE", default=10000, cast=int)
+    ENGAGEMENT_FLUSH_SIZE: int = config("ENGAGEMENT_FLUSH_SIZE", default=500, cast=int)
+    ENGAGEMENT_FLUSH_INTERVAL: float = config("ENGAGEMENT_FLUSH_INTERVAL", default=2.0, cast=float)  # seconds
+    ENGAGEMENT_MAX_BACKOFF: float = config("ENGAGEMENT_MAX_BACKOFF", default=60.0, cast=float)  # seconds
+    ENGAGEMENT_SUBMIT_TIMEOUT: float = config("ENGAGEMENT_SUBMIT_TIMEOUT", default=1.0, cast=float)  # seconds before a 503
 
 settings = Settings()
\ No newline at end of file
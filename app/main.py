@@ -4,6 +4,14 @@ import asyncio
 from app.routers import auth, data, users, organizations, complaints, chat, payment
 from app.utils.social_auth import router as social_auth_router
 from app.database import engine, Base
+# Register the models on Base.metadata before create_all (the chat models come with the chat router)
+from app.models import (
+    company, complaint, complaints_history, engagement, feed, image, organization,
+    reply, scheduler_lease, score_history, search, trending, user
+)
+from app.utils.engagement import engagement_buffer
+from app.utils.pubsub import chat_broker
+from app.utils.trending import keep_trending_in_sync
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
@@ -21,6 +29,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Include routers
@@ -50,6 +59,18 @@ async def startup_event():
         asyncio.create_task(start_scheduler())
     except ImportError:
         print("Scheduler not available, skipping background tasks")
+    
+    # Buffer complaint views and shares
+    engagement_buffer.start()
+    
+    # Count trending hashtags in memory
+    asyncio.create_task(keep_trending_in_sync())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Flush buffered writes and disconnect from the chat broker"""
+    await engagement_buffer.stop()
+    await chat_broker.close()
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, Index
 from sqlalchemy.sql import func
 from app.database import Base
 
@@ -6,12 +6,22 @@ class Chat(Base):
     __tablename__ = "chats"
 
     id = Column(Integer, primary_key=True, index=True)
-    complaint_id = Column(Integer)
+    complaint_id = Column(Integer, index=True)
     company_id = Column(Integer)
     title = Column(String(255))
     last_message_date = Column(DateTime(6), default=func.now())
     user_id = Column(Integer)
     is_read_by_user = Column(Boolean, default=False)
+    # Inbox preview and counter, kept up to date when messages are sent and read
+    last_message_id = Column(Integer)
+    last_message_preview = Column(String(255))
+    last_message_from_admin = Column(Boolean)
+    unread_by_user = Column(Integer, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        # A user's chats, most recent first
+        Index("ix_chats_user_last_message", "user_id", "last_message_date"),
+    )
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
@@ -24,10 +34,23 @@ class ChatMessage(Base):
     message = Column(Text)
     sent_date = Column(DateTime(6), default=func.now())
 
+    __table_args__ = (
+        # A chat's messages in order
+        Index("ix_chat_messages_chat_sent", "chat_id", "sent_date", "id"),
+    )
+
 class ChatCompany(Base):
     __tablename__ = "chat_companies"
 
     id = Column(Integer, primary_key=True, index=True)
-    chat_id = Column(Integer)
-    company_id = Column(Integer)
-    is_read_by_admin = Column(Boolean, default=False)
\ No newline at end of file
+    chat_id = Column(Integer, index=True)
+    company_id = Column(Integer, index=True)
+    is_read_by_admin = Column(Boolean, default=False)
+    # Copies of the chat's last message date and the admins' unread counter, for the admin inbox
+    last_message_date = Column(DateTime(6))
+    unread_by_admin = Column(Integer, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        # An organization's chats, most recent first
+        Index("ix_chat_companies_company_last_message", "company_id", "last_message_date", "chat_id"),
+    )
\ No newline at end of file
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Enum, Boolean, DECIMAL, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, Enum, Boolean, DECIMAL, JSON, Index
+from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
 from app.database import Base
 import enum
@@ -31,19 +32,39 @@ class Complaint(Base):
     finished = Column(DateTime)
     location = Column(String(255))
     state = Column(Enum(ComplaintState), default=ComplaintState.submitted)
-    state_dates = Column(JSON)
+    # Legacy; transitions are recorded in complaints_history and complaint_timings
+    state_dates = deferred(Column(JSON))
     hashtags = Column(JSON)
     anonymous = Column(Boolean, default=False)
     reimbursement = Column(Boolean, default=False)
     reimbursement_amount = Column(DECIMAL(10, 2))
     waiting_timer = Column(Boolean, default=False)
     twitter = Column(Boolean, default=False)
-    facebook_shares = Column(JSON)
-    twitter_shares = Column(JSON)
-    speaks_shares = Column(JSON)
-    views = Column(JSON)
+    # Legacy lists of user ids, moved into complaint_engagements by
+    # python -m app.utils.engagement and no longer written
+    facebook_shares = deferred(Column(JSON))
+    twitter_shares = deferred(Column(JSON))
+    speaks_shares = deferred(Column(JSON))
+    views = deferred(Column(JSON))
+    # Distinct users per engagement kind, maintained with complaint_engagements
+    views_count = Column(Integer, nullable=False, default=0, server_default="0")
+    facebook_shares_count = Column(Integer, nullable=False, default=0, server_default="0")
+    twitter_shares_count = Column(Integer, nullable=False, default=0, server_default="0")
+    speaks_shares_count = Column(Integer, nullable=False, default=0, server_default="0")
     reopen = Column(Boolean, default=False)
     mood = Column(Enum(ComplaintMood))
     angry_level = Column(DECIMAL(2, 1))
     message = Column(Text)
-    description = Column(Text)
\ No newline at end of file
+    description = Column(Text)
+    # Token of the bulk ingestion chunk that inserted the row, to read the ids back
+    ingest_batch = deferred(Column(String(32)))
+
+    __table_args__ = (
+        # Keyset pagination on (created, id), per organization and globally
+        Index("ix_complaints_company_created", "company_id", "created", "id"),
+        Index("ix_complaints_created", "created", "id"),
+        # A user's complaints, newest first
+        Index("ix_complaints_user_created", "user_id", "created"),
+        Index("ix_complaints_state", "state"),
+        Index("ix_complaints_ingest_batch", "ingest_batch"),
+    )
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Text, DateTime
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index
 from sqlalchemy.sql import func
 from app.database import Base
 
@@ -8,4 +8,36 @@ class ComplaintsHistory(Base):
     id = Column(Integer, primary_key=True, index=True)
     complaint_id = Column(Integer)
     date = Column(DateTime, default=func.now())
-    message = Column(Text)
\ No newline at end of file
+    message = Column(Text)
+    # State transition, append-only; from_state is empty for the creation row
+    from_state = Column(String(16))
+    to_state = Column(String(16))
+    changed_by = Column(Integer)
+
+    __table_args__ = (
+        Index("ix_complaints_history_complaint_date", "complaint_id", "date"),
+    )
+
+class ComplaintTiming(Base):
+    """
+    When a complaint was first opened, responded to and resolved, and how
+    many seconds after its creation, maintained from its state transitions
+    """
+    __tablename__ = "complaint_timings"
+
+    complaint_id = Column(Integer, primary_key=True)
+    company_id = Column(Integer, nullable=False)
+    created = Column(DateTime)
+    opened_at = Column(DateTime)
+    responded_at = Column(DateTime)
+    resolved_at = Column(DateTime)
+    seconds_to_open = Column(Integer)
+    seconds_to_respond = Column(Integer)
+    seconds_to_resolve = Column(Integer)
+
+    __table_args__ = (
+        # Per-organization percentiles are index range scans
+        Index("ix_complaint_timings_company_open", "company_id", "seconds_to_open"),
+        Index("ix_complaint_timings_company_respond", "company_id", "seconds_to_respond"),
+        Index("ix_complaint_timings_company_resolve", "company_id", "seconds_to_resolve"),
+    )
@@ -0,0 +1,10 @@
+from sqlalchemy import Column, Integer, String
+from app.database import Base
+
+class ComplaintEngagement(Base):
+    """One row per user who viewed or shared a complaint, per kind of engagement"""
+    __tablename__ = "complaint_engagements"
+
+    complaint_id = Column(Integer, primary_key=True)
+    kind = Column(String(16), primary_key=True)  # view, facebook, twitter or speaks
+    user_id = Column(Integer, primary_key=True)
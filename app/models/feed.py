@@ -0,0 +1,37 @@
+from sqlalchemy import Column, Integer, DateTime, Index
+from app.database import Base
+
+class OrganizationFollower(Base):
+    """Reverse index of User.follows, used to fan complaints out to followers"""
+    __tablename__ = "organization_followers"
+
+    organization_id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, primary_key=True)
+
+    __table_args__ = (
+        Index("ix_organization_followers_user", "user_id"),
+    )
+
+class FeedEntry(Base):
+    """Materialized /myfeed entry, written when a complaint is fanned out to a follower"""
+    __tablename__ = "feed_entries"
+
+    user_id = Column(Integer, primary_key=True)
+    complaint_id = Column(Integer, primary_key=True)
+    company_id = Column(Integer, nullable=False)
+    created = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_feed_entries_user_created", "user_id", "created", "complaint_id"),
+        Index("ix_feed_entries_complaint", "complaint_id"),
+    )
+
+class FeedSize(Base):
+    """
+    Upper bound of the number of feed entries of a user, raised on every
+    fan-out so feeds are capped at write time without counting them
+    """
+    __tablename__ = "feed_sizes"
+
+    user_id = Column(Integer, primary_key=True)
+    entries = Column(Integer, nullable=False, default=0)
@@ -6,4 +6,4 @@ class Image(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     src = Column(String(255))
-    complaint_id = Column(Integer)
\ No newline at end of file
+    complaint_id = Column(Integer, index=True)
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, JSON, DECIMAL
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Boolean, Text, JSON, DECIMAL
 from sqlalchemy.sql import func
 from app.database import Base
 
@@ -46,12 +46,24 @@ class Organization(Base):
     #   reimbursed: int,
     #   gainedVotes: int,
     #   lostVotes: int,
-    #   dataGraph: {
-    #     day: [float] * 12,
-    #     days: [float] * 31,
-    #     month: [float] * 12,
-    #     year: [float] * 12
-    #   },
     #   votes: [{user: ObjectId, gained: bool, date: Date}]
     # }
-    stats = Column(JSON)
\ No newline at end of file
+    # Score history (the former dataGraph arrays) lives in score_samples / score_rollups
+    stats = Column(JSON)
+
+class OrganizationCounter(Base):
+    """
+    Running per-organization counters maintained incrementally on complaint
+    and chat events; the hourly stats job reconciles them against the tables.
+    """
+    __tablename__ = "organization_counters"
+
+    organization_id = Column(Integer, primary_key=True)
+    complaints_total = Column(Integer, nullable=False, default=0)
+    resolved = Column(Integer, nullable=False, default=0)
+    reimbursed = Column(Integer, nullable=False, default=0)
+    unresolved = Column(Integer, nullable=False, default=0)
+    # Sum of `created` (seconds since epoch) over unresolved complaints
+    unresolved_created_sum = Column(BigInteger, nullable=False, default=0)
+    chats = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
@@ -6,6 +6,6 @@ class Reply(Base):
     __tablename__ = "replies"
 
     id = Column(Integer, primary_key=True, index=True)
-    complaint_id = Column(Integer, nullable=False)
+    complaint_id = Column(Integer, nullable=False, index=True)
     message = Column(Text)
     sent = Column(DateTime, default=func.now())
\ No newline at end of file
@@ -0,0 +1,11 @@
+from sqlalchemy import Column, String, DateTime
+from app.database import Base
+
+class SchedulerLease(Base):
+    """Leadership lease of a scheduled job, shared by every worker process"""
+    __tablename__ = "scheduler_leases"
+
+    name = Column(String(64), primary_key=True)
+    holder = Column(String(255), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    last_run_at = Column(DateTime)
@@ -0,0 +1,30 @@
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Float, Index
+from app.database import Base
+
+class ScoreSample(Base):
+    """Append-only organization score samples, one per stats pass"""
+    __tablename__ = "score_samples"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    organization_id = Column(Integer, nullable=False)
+    sampled_at = Column(DateTime, nullable=False)
+    score = Column(Float, nullable=False)
+
+    __table_args__ = (
+        Index("ix_score_samples_org_sampled", "organization_id", "sampled_at"),
+    )
+
+class ScoreRollup(Base):
+    """
+    Downsampled score history per organization
+    
+    resolution is one of 2h, day, month, year; bucket_start is the start of
+    the bucket and the bucket average is score_sum / samples.
+    """
+    __tablename__ = "score_rollups"
+
+    organization_id = Column(Integer, primary_key=True)
+    resolution = Column(String(8), primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    score_sum = Column(Float, nullable=False, default=0)
+    samples = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, String, Index
+from app.database import Base
+
+class ComplaintTerm(Base):
+    """Inverted index posting: a term of a complaint and its field-weighted frequency"""
+    __tablename__ = "complaint_terms"
+
+    term = Column(String(64), primary_key=True)
+    complaint_id = Column(Integer, primary_key=True)
+    company_id = Column(Integer, nullable=False)
+    weight = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_complaint_terms_term_company", "term", "company_id", "complaint_id"),
+        Index("ix_complaint_terms_complaint", "complaint_id"),
+    )
+
+class SearchTerm(Base):
+    """Number of complaints containing each indexed term"""
+    __tablename__ = "search_terms"
+
+    term = Column(String(64), primary_key=True)
+    documents = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, String
+from app.database import Base
+
+class HashtagRollup(Base):
+    """
+    Hashtag counts of new complaints per organization and time bucket
+    
+    bucket_seconds is the bucket width and bucket the bucket number since
+    the epoch. Every worker rebuilds its in-memory trending counters from
+    these rows, so the counts of complaints created through other workers
+    reach it without scanning complaints.
+    """
+    __tablename__ = "hashtag_rollups"
+
+    bucket_seconds = Column(Integer, primary_key=True)
+    bucket = Column(Integer, primary_key=True)
+    organization_id = Column(Integer, primary_key=True)
+    hashtag = Column(String(100), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
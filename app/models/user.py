@@ -10,7 +10,7 @@ class User(Base):
     last_name = Column(String(255))
     email = Column(String(255), unique=True, nullable=False, index=True)
     password = Column(String(255), nullable=False)
-    verification_token = Column(String(255))
+    verification_token = Column(String(255), index=True)
     username = Column(String(255))
     kind = Column(Integer, default=0)  # 0: Client, 1: Premium
     
@@ -28,15 +28,6 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
             detail=f"The user with email {user.email} already exists"
         )
     
-    # Get all organizations for follows initialization (matching MongoDB behavior)
-    organizations = db.query(Organization).all()
-    follows = []
-    for org in organizations:
-        follows.append({
-            "companyId": org.id,
-            "opinions": []
-        })
-    
     # Create new user with MongoDB-compatible structure
     verification_token = secrets.token_urlsafe(32)
     hashed_password = get_password_hash(user.password)
@@ -52,7 +43,7 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
             "medium": "",
             "small": "https://s3.amazonaws.com/complaints-wespeak/Users/Tester/avatar.png"
         },
-        follows=follows,  # Initialize with all organizations
+        follows=[],  # Organizations are followed through /api/organizations/follow
         payment={}  # Empty payment object
     )
     
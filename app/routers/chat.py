@@ -1,14 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, WebSocket, status
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import case, false, func
 from sqlalchemy.orm import Session
-from typing import List
-from app.database import get_db
+from typing import Dict, List, Optional, Tuple
+import asyncio
+from app.database import SessionLocal, get_db
 from app.models.chat import Chat, ChatMessage, ChatCompany
 from app.models.complaint import Complaint
+from app.models.organization import Organization
 from app.models.user import User
-from app.utils.auth import get_current_user, get_current_premium_user
+from app.utils.auth import get_current_user, get_current_premium_user, verify_token
+from app.utils.pagination import NEXT_CURSOR_HEADER, encode_cursor, paginate_newest_first, paginate_oldest_first
+from app.utils.pubsub import chat_broker, chat_channel, company_inbox_channel, user_inbox_channel
+from app.utils.stats import record_chat_created
 
 router = APIRouter(prefix="/api/chat", tags=["chat"])
 
+# Characters of the last message kept for inbox previews
+PREVIEW_LENGTH = 140
+
 @router.get("/chatlist")
 async def get_chat_list(
     current_user: User = Depends(get_current_user),
@@ -16,7 +26,7 @@ async def get_chat_list(
 ):
     if current_user.kind == 1:  # Premium user (admin)
         # Get chats for organizations where user is admin
-        chats = db.query(Chat).join(ChatCompany).filter(
+        chats = db.query(Chat).join(ChatCompany, ChatCompany.chat_id == Chat.id).filter(
             ChatCompany.company_id.in_(get_user_admin_companies(current_user.id, db))
         ).order_by(Chat.last_message_date.desc()).all()
     else:
@@ -27,13 +37,60 @@ async def get_chat_list(
     
     return chats
 
-@router.get("/{complaint_id}")
-async def get_chat(
-    complaint_id: int,
+@router.get("/inbox")
+async def get_inbox(
+    response: Response,
+    size: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    # Get complaint first
+    """
+    The caller's chats, most recent first, with their last message and unread count
+    
+    Previews and counters are stored on the chat rows, so a page is one query
+    and the unread badge a second one. Pages are cursor-paginated on the last
+    message date (X-Next-Cursor).
+    """
+    if current_user.kind == 1:  # Admin
+        companies = get_user_admin_companies(current_user.id, db)
+        query = db.query(
+            Chat, ChatCompany.unread_by_admin.label("unread"), ChatCompany.last_message_date
+        ).join(Chat, Chat.id == ChatCompany.chat_id).filter(ChatCompany.company_id.in_(companies))
+        date_column, id_column = ChatCompany.last_message_date, ChatCompany.chat_id
+        badge = db.query(func.sum(ChatCompany.unread_by_admin)).filter(ChatCompany.company_id.in_(companies))
+    else:
+        query = db.query(Chat, Chat.unread_by_user.label("unread"), Chat.last_message_date).filter(
+            Chat.user_id == current_user.id
+        )
+        date_column, id_column = Chat.last_message_date, Chat.id
+        badge = db.query(func.sum(Chat.unread_by_user)).filter(Chat.user_id == current_user.id)
+    
+    # Chats without messages yet have no date to page on
+    query = query.filter(date_column.isnot(None))
+    rows = paginate_newest_first(query, date_column, id_column, size, cursor=cursor)
+    if len(rows) == size:
+        chat, _, last_message_date = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last_message_date, chat.id)
+    
+    return {
+        "chats": [
+            {
+                "chat": chat,
+                "last_message": {
+                    "id": chat.last_message_id,
+                    "message": chat.last_message_preview,
+                    "sent_date": last_message_date,
+                    "from_admin": chat.last_message_from_admin
+                } if chat.last_message_id else None,
+                "unread": unread
+            }
+            for chat, unread, last_message_date in rows
+        ],
+        "unread_total": int(badge.scalar() or 0)
+    }
+
+def _get_accessible_complaint(complaint_id: int, current_user: User, db: Session) -> Complaint:
     complaint = db.query(Complaint).filter(Complaint.id == complaint_id).first()
     
     if not complaint:
@@ -48,59 +105,130 @@ async def get_chat(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Access denied"
         )
+    return complaint
+
+def _message_cursor(message: ChatMessage) -> str:
+    return encode_cursor(message.sent_date, message.id)
+
+def load_messages(
+    db: Session,
+    chat_id: int,
+    limit: int,
+    before: Optional[str] = None,
+    after: Optional[str] = None
+) -> Dict:
+    """
+    One page of a chat's messages in sending order, with the cursors around it
+    
+    Without `after` this is the latest page, or the one right before the
+    `before` cursor; `before` in the result fetches the page older than it
+    and is None once the start of the chat is reached. With `after` only the
+    messages sent since that cursor are returned. `after` in the result is
+    the cursor to poll for newer messages.
+    """
+    query = db.query(ChatMessage).filter(ChatMessage.chat_id == chat_id)
+    if after:
+        messages = paginate_oldest_first(query, ChatMessage.sent_date, ChatMessage.id, limit, cursor=after)
+        older = None
+    else:
+        messages = paginate_newest_first(query, ChatMessage.sent_date, ChatMessage.id, limit, cursor=before)[::-1]
+        older = _message_cursor(messages[0]) if len(messages) == limit else None
+    
+    return {
+        "messages": messages,
+        "before": older,
+        "after": _message_cursor(messages[-1]) if messages else after
+    }
+
+def mark_chat_read(db: Session, chat: Chat, user: User):
+    """Reset the read flag and unread counter of the user's side of a chat, committing only if they change"""
+    if user.kind == 1:  # Admin
+        read = db.query(ChatCompany).filter(
+            ChatCompany.chat_id == chat.id,
+            ChatCompany.company_id.in_(get_user_admin_companies(user.id, db))
+        ).first()
+        if read and (not read.is_read_by_admin or read.unread_by_admin):
+            read.is_read_by_admin = True
+            read.unread_by_admin = 0
+            db.commit()
+    elif not chat.is_read_by_user or chat.unread_by_user:  # User
+        chat.is_read_by_user = True
+        chat.unread_by_user = 0
+        db.commit()
+
+@router.get("/{complaint_id}")
+async def get_chat(
+    complaint_id: int,
+    limit: int = Query(50, ge=1, le=200),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """The chat of a complaint with its latest page of messages; older ones come from /messages"""
+    complaint = _get_accessible_complaint(complaint_id, current_user, db)
     
     # Get chat
     chat = db.query(Chat).filter(Chat.complaint_id == complaint_id).first()
     
     if chat:
-        # Mark as read
-        if current_user.kind == 1:  # Admin
-            # Update admin read status
-            chat_company = db.query(ChatCompany).filter(
-                ChatCompany.chat_id == chat.id,
-                ChatCompany.company_id.in_(get_user_admin_companies(current_user.id, db))
-            ).first()
-            if chat_company:
-                chat_company.is_read_by_admin = True
-        else:  # User
-            chat.is_read_by_user = True
-        
-        db.commit()
-        
-        # Get messages
-        messages = db.query(ChatMessage).filter(
-            ChatMessage.chat_id == chat.id
-        ).order_by(ChatMessage.sent_date).all()
+        mark_chat_read(db, chat, current_user)
         
         return {
             "chat": chat,
-            "messages": messages,
+            **load_messages(db, chat.id, limit),
             "complaint": complaint
         }
     
-    return {"chat": None, "messages": [], "complaint": complaint}
+    return {"chat": None, "messages": [], "before": None, "after": None, "complaint": complaint}
 
-@router.post("/{complaint_id}")
-async def send_message(
+@router.get("/{complaint_id}/messages")
+async def get_chat_messages(
     complaint_id: int,
-    message_data: dict,
+    before: Optional[str] = Query(None),
+    after: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=200),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    complaint = db.query(Complaint).filter(Complaint.id == complaint_id).first()
+    """
+    Page through a chat's messages
     
-    if not complaint:
+    `before` loads older history, `after` only the messages sent since the
+    last fetch. A full page means more messages may follow in that direction.
+    """
+    if before and after:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Complaint not found"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Use either before or after"
         )
+    _get_accessible_complaint(complaint_id, current_user, db)
     
-    # Check access permissions
-    if complaint.user_id != current_user.id and current_user.kind != 1:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied"
-        )
+    chat = db.query(Chat).filter(Chat.complaint_id == complaint_id).first()
+    if not chat:
+        return {"messages": [], "before": None, "after": after}
+    return load_messages(db, chat.id, limit, before=before, after=after)
+
+@router.put("/{complaint_id}/read")
+async def read_chat(
+    complaint_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Mark a chat read, for clients that get new messages pushed instead of reloading the chat"""
+    _get_accessible_complaint(complaint_id, current_user, db)
+    
+    chat = db.query(Chat).filter(Chat.complaint_id == complaint_id).first()
+    if chat:
+        mark_chat_read(db, chat, current_user)
+    return {"message": "Chat marked as read"}
+
+@router.post("/{complaint_id}")
+async def send_message(
+    complaint_id: int,
+    message_data: dict,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    complaint = _get_accessible_complaint(complaint_id, current_user, db)
     
     # Get or create chat
     chat = db.query(Chat).filter(Chat.complaint_id == complaint_id).first()
@@ -114,6 +242,7 @@ async def send_message(
             user_id=complaint.user_id,
             is_read_by_user=(complaint.user_id == current_user.id)
         )
+        record_chat_created(complaint.company_id, db)
         db.add(chat)
         db.commit()
         db.refresh(chat)
@@ -126,38 +255,147 @@ async def send_message(
         )
         db.add(chat_company)
     
+    admin_company = get_user_admin_company(current_user.id, db) if current_user.kind == 1 else None
+    
     # Add message
     new_message = ChatMessage(
         chat_id=chat.id,
         user_id=str(current_user.id) if current_user.kind == 0 else None,
         admin_user_id=current_user.id if current_user.kind == 1 else None,
-        organization_of_admin=get_user_admin_company(current_user.id, db) if current_user.kind == 1 else None,
+        organization_of_admin=admin_company,
         message=message_data["message"]
     )
     
     db.add(new_message)
+    db.flush()
+    # sent_date is filled in by the database
+    db.refresh(new_message, ["sent_date"])
     
-    # Update chat
+    # Update chat and the unread counters of both sides
+    from_user = complaint.user_id == current_user.id
     chat.last_message_date = new_message.sent_date
-    chat.is_read_by_user = (complaint.user_id == current_user.id)
+    chat.last_message_id = new_message.id
+    chat.last_message_preview = new_message.message[:PREVIEW_LENGTH]
+    chat.last_message_from_admin = current_user.kind == 1
+    chat.is_read_by_user = from_user
+    chat.unread_by_user = 0 if from_user else Chat.unread_by_user + 1
     
-    # Update chat company read status
-    if current_user.kind == 1:
-        chat_companies = db.query(ChatCompany).filter(ChatCompany.chat_id == chat.id).all()
-        for cc in chat_companies:
-            cc.is_read_by_admin = (cc.company_id == get_user_admin_company(current_user.id, db))
+    # The sender's organization has read the chat, every other one gets one more unread message
+    is_sender = ChatCompany.company_id == admin_company if admin_company is not None else false()
+    db.query(ChatCompany).filter(ChatCompany.chat_id == chat.id).update({
+        ChatCompany.last_message_date: new_message.sent_date,
+        ChatCompany.is_read_by_admin: is_sender,
+        ChatCompany.unread_by_admin: case((is_sender, 0), else_=ChatCompany.unread_by_admin + 1)
+    }, synchronize_session=False)
     
+    channels, event = chat_message_event(chat, new_message)
     db.commit()
     
+    for channel in channels:
+        await chat_broker.publish(channel, event)
+    
     return {"message": "Message sent successfully", "chat": chat}
 
+def chat_message_event(chat: Chat, message: ChatMessage) -> Tuple[List[str], Dict]:
+    """
+    Channels and payload announcing a sent message: the chat itself and both
+    sides' inboxes. Built before the commit expires the rows.
+    """
+    event = jsonable_encoder({
+        "event": "message",
+        "chat_id": chat.id,
+        "complaint_id": chat.complaint_id,
+        "message": {column.key: getattr(message, column.key) for column in ChatMessage.__table__.columns}
+    })
+    return [chat_channel(chat.id), user_inbox_channel(chat.user_id), company_inbox_channel(chat.company_id)], event
+
+def _websocket_user(websocket: WebSocket, db: Session) -> Optional[User]:
+    """User of a WebSocket's `token` query parameter or bearer header, since browsers can't set headers"""
+    token = websocket.query_params.get("token")
+    authorization = websocket.headers.get("authorization", "")
+    if not token and authorization.lower().startswith("bearer "):
+        token = authorization[7:]
+    if not token:
+        return None
+    try:
+        email = verify_token(token)
+    except HTTPException:
+        return None
+    return db.query(User).filter(User.email == email).first()
+
+async def _relay(websocket: WebSocket, channels: List[str]):
+    """Push the messages of `channels` to the socket until the client disconnects"""
+    async with chat_broker.subscribe(channels) as messages:
+        async def push():
+            async for message in messages:
+                await websocket.send_json(message)
+        
+        async def wait_for_disconnect():
+            while (await websocket.receive())["type"] != "websocket.disconnect":
+                pass
+        
+        tasks = [asyncio.create_task(push()), asyncio.create_task(wait_for_disconnect())]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+@router.websocket("/ws/inbox")
+async def inbox_socket(websocket: WebSocket):
+    """New messages of every chat of the user, or of the admin's organizations"""
+    db = SessionLocal()
+    try:
+        user = _websocket_user(websocket, db)
+        if user is None:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+        if user.kind == 1:
+            channels = [company_inbox_channel(company_id) for company_id in get_user_admin_companies(user.id, db)]
+        else:
+            channels = [user_inbox_channel(user.id)]
+    finally:
+        # The connection can stay open for hours; don't hold a database connection with it
+        db.close()
+    
+    await websocket.accept()
+    await _relay(websocket, channels)
+
+@router.websocket("/ws/{complaint_id}")
+async def chat_socket(websocket: WebSocket, complaint_id: int):
+    """New messages of the chat of one complaint"""
+    db = SessionLocal()
+    try:
+        user = _websocket_user(websocket, db)
+        if user is None:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+        complaint = db.query(Complaint).filter(Complaint.id == complaint_id).first()
+        if not complaint or (complaint.user_id != user.id and user.kind != 1):
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+        chat = db.query(Chat).filter(Chat.complaint_id == complaint_id).first()
+        if not chat:
+            # The first message creates the chat; until then there is nothing to follow
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+        chat_id = chat.id
+    finally:
+        db.close()
+    
+    await websocket.accept()
+    await _relay(websocket, [chat_channel(chat_id)])
+
 def get_user_admin_companies(user_id: int, db: Session) -> List[int]:
-    """Get list of company IDs where user is admin"""
-    from app.models.organization import Organization
-    orgs = db.query(Organization).filter(
+    """
+    Get list of company IDs where user is admin
+    
+    Read on every call, not cached, so removing an admin revokes their
+    access to the organization's chats right away.
+    """
+    return [org_id for (org_id,) in db.query(Organization.id).filter(
         Organization.admins.contains([user_id])
-    ).all()
-    return [org.id for org in orgs]
+    ).order_by(Organization.id)]
 
 def get_user_admin_company(user_id: int, db: Session) -> int:
     """Get first company ID where user is admin"""
@@ -1,18 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Query, Request, Response
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from typing import List, Optional
+from datetime import datetime
 from app.database import get_db
-from app.models.complaint import Complaint
+from app.models.complaint import Complaint, ComplaintState
 from app.models.user import User
-from app.models.organization import Organization
-from app.schemas.complaint import ComplaintCreate, ComplaintResponse, ComplaintUpdate
+from app.models.organization import Organization, OrganizationCounter
+from app.schemas.complaint import ComplaintCreate, ComplaintResponse, ComplaintUpdate, TrendingHashtag
 from app.utils.auth import get_current_user, get_current_premium_user
+from app.utils.engagement import track_engagement
+from app.utils.feed import fan_out_complaint, load_feed, sync_feed_state
+from app.utils.pagination import NEXT_CURSOR_HEADER, encode_cursor, paginate_newest_first
+from app.utils.search import index_complaint, search_complaints
+from app.utils.state_history import record_complaints_started, record_state_change
+from app.utils.stats import crisis_feed_cache, record_complaint_created, update_complaint_stats
+from app.utils.streaming import ndjson_response, wants_ndjson
+from app.utils.trending import WINDOWS, store_hashtags, trending_hashtags
 
 router = APIRouter(prefix="/api/complaints", tags=["complaints"])
 
 @router.post("/", response_model=ComplaintResponse)
 async def create_complaint(
     complaint_data: dict,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -33,11 +44,8 @@ async def create_complaint(
         waiting_timer=complaint_info.get("waitingTimer", False),
         mood=complaint_info.get("mood"),
         state="submitted",
-        state_dates=[],
-        views=[],
-        facebook_shares=[],
-        twitter_shares=[],
-        speaks_shares=[]
+        # UTC from here rather than the database clock, like the state change timestamps
+        created=datetime.utcnow()
     )
     
     # Handle image uploads if provided
@@ -46,9 +54,16 @@ async def create_complaint(
         # This would need to be implemented based on how images are sent
         pass
     
+    record_complaint_created(new_complaint, db)
     db.add(new_complaint)
+    db.flush()
+    fan_out_complaint(db, new_complaint, background_tasks)
+    index_complaint(db, new_complaint)
+    record_complaints_started(db, [new_complaint.id])
+    store_hashtags(db, [(new_complaint.hashtags, new_complaint.company_id)], new_complaint.created)
     db.commit()
     db.refresh(new_complaint)
+    trending_hashtags.record(new_complaint.hashtags, new_complaint.company_id, new_complaint.created)
     
     return new_complaint
 
@@ -73,68 +88,116 @@ async def get_user_complaints(
 
 @router.get("/organization/", response_model=List[ComplaintResponse])
 async def get_all_complaints(
+    request: Request,
+    stream: int = Query(0),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
+    if wants_ndjson(request, stream):
+        return ndjson_response(
+            lambda session: session.query(Complaint).order_by(Complaint.created.desc(), Complaint.id.desc()),
+            ComplaintResponse
+        )
+    
     complaints = db.query(Complaint).order_by(Complaint.created.desc()).all()
     return complaints
 
 @router.get("/organization/{organization_id}", response_model=List[ComplaintResponse])
 async def get_organization_complaints(
     organization_id: int,
+    response: Response,
     size: int = Query(20),
     page: int = Query(0),
+    cursor: Optional[str] = Query(None),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    complaints = db.query(Complaint).filter(
-        Complaint.company_id == organization_id
-    ).order_by(Complaint.created.desc()).offset(page).limit(size).all()
-    
-    return complaints
+    query = db.query(Complaint).filter(Complaint.company_id == organization_id)
+    return paginate_newest_first(query, Complaint.created, Complaint.id, size, page, cursor, response)
 
 @router.get("/myfeed", response_model=List[ComplaintResponse])
 async def get_user_feed(
+    response: Response,
     size: int = Query(20),
     page: int = Query(0),
+    cursor: Optional[str] = Query(None),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    # Get companies user follows
-    follows = current_user.follows or []
-    company_ids = [follow.get("companyId") for follow in follows]
-    
-    complaints = db.query(Complaint).filter(
-        Complaint.company_id.in_(company_ids),
-        Complaint.state.in_(["submitted", "opened", "responded"])
-    ).order_by(Complaint.created.desc()).offset(page).limit(size).all()
-    
+    complaints, next_cursor = load_feed(db, current_user, size, page, cursor)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return complaints
+
+@router.get("/search", response_model=List[ComplaintResponse])
+async def search_complaints_by_text(
+    response: Response,
+    q: str = Query(..., min_length=1),
+    company_id: Optional[int] = Query(None),
+    state: Optional[ComplaintState] = Query(None),
+    size: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    complaints, next_cursor = search_complaints(db, q, size, company_id, state.value if state else None, cursor)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return complaints
 
+@router.get("/trending", response_model=List[TrendingHashtag])
+async def get_trending_hashtags(
+    window: str = Query("day"),
+    company_id: Optional[int] = Query(None),
+    limit: int = Query(10, ge=1, le=100),
+    current_user: User = Depends(get_current_user)
+):
+    if window not in WINDOWS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"window must be one of {', '.join(WINDOWS)}"
+        )
+    
+    return [
+        {"hashtag": hashtag, "count": count}
+        for hashtag, count in trending_hashtags.top(window, limit, company_id)
+    ]
+
 @router.get("/crisis", response_model=List[ComplaintResponse])
 async def get_crisis_complaints(
+    response: Response,
     size: int = Query(20),
     page: int = Query(0),
+    cursor: Optional[str] = Query(None),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    # Get organizations in crisis
-    crisis_orgs = db.query(Organization).filter(
-        Organization.is_crisis == True
-    ).order_by(Organization.stats["complaintsCounter"].desc()).limit(5).all()
-    
-    org_ids = [org.id for org in crisis_orgs]
-    
-    complaints = db.query(Complaint).filter(
-        Complaint.company_id.in_(org_ids)
-    ).order_by(Complaint.created.desc()).offset(page).limit(size).all()
+    def load():
+        # Get organizations in crisis, busiest first
+        crisis_orgs = db.query(Organization.id).outerjoin(
+            OrganizationCounter, OrganizationCounter.organization_id == Organization.id
+        ).filter(
+            Organization.is_crisis == True
+        ).order_by(func.coalesce(OrganizationCounter.complaints_total, 0).desc(), Organization.id).limit(5).all()
+        
+        org_ids = [org_id for (org_id,) in crisis_orgs]
+        
+        query = db.query(Complaint).filter(Complaint.company_id.in_(org_ids))
+        items = paginate_newest_first(query, Complaint.created, Complaint.id, size, page, cursor)
+        next_cursor = encode_cursor(items[-1].created, items[-1].id) if len(items) == size else None
+        return [ComplaintResponse.model_validate(item) for item in items], next_cursor
     
+    # The crisis feed is the same for every user
+    complaints, next_cursor = crisis_feed_cache.get((size, page, cursor), load)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return complaints
 
 @router.put("/change-state/{complaint_id}", response_model=ComplaintResponse)
 async def change_complaint_state(
     complaint_id: int,
     state_data: dict,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -147,15 +210,15 @@ async def change_complaint_state(
         )
     
     new_state = state_data.get("state")
+    previous_state = complaint.state
     complaint.state = new_state
     
     if new_state in ["resolved", "reimbursed"]:
         complaint.reopen = False
     
-    # Update state dates
-    state_dates = complaint.state_dates or []
-    # Add logic to update state dates based on new state
-    
+    record_state_change(db, complaint, previous_state, current_user.id)
+    update_complaint_stats(complaint, db, previous_state)
+    sync_feed_state(db, complaint, previous_state, background_tasks)
     db.commit()
     db.refresh(complaint)
     
@@ -164,6 +227,7 @@ async def change_complaint_state(
 @router.put("/reopen-complaint/{complaint_id}", response_model=ComplaintResponse)
 async def reopen_complaint(
     complaint_id: int,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -176,8 +240,12 @@ async def reopen_complaint(
         )
     
     if not complaint.reopen:
+        previous_state = complaint.state
         complaint.state = "opened"
         complaint.reopen = True
+        record_state_change(db, complaint, previous_state, current_user.id)
+        update_complaint_stats(complaint, db, previous_state)
+        sync_feed_state(db, complaint, previous_state, background_tasks)
         db.commit()
     
     db.refresh(complaint)
@@ -197,13 +265,9 @@ async def view_complaint(
             detail="Complaint not found"
         )
     
-    views = complaint.views or []
-    if current_user.id not in views:
-        views.append(current_user.id)
-        complaint.views = views
-        db.commit()
+    counts = await track_engagement(db, complaint.id, current_user.id, ["view"])
     
-    return {"views": len(views)}
+    return {"views": counts["view"]}
 
 @router.post("/shares-count/{kind}/{complaint_id}")
 async def share_complaint(
@@ -220,23 +284,8 @@ async def share_complaint(
             detail="Complaint not found"
         )
     
-    if kind == 0:  # Facebook
-        shares = complaint.facebook_shares or []
-        if current_user.id not in shares:
-            shares.append(current_user.id)
-            complaint.facebook_shares = shares
-    else:  # Twitter
-        shares = complaint.twitter_shares or []
-        if current_user.id not in shares:
-            shares.append(current_user.id)
-            complaint.twitter_shares = shares
-    
-    # Update speaks_shares
-    speaks_shares = complaint.speaks_shares or []
-    if current_user.id not in speaks_shares:
-        speaks_shares.append(current_user.id)
-        complaint.speaks_shares = speaks_shares
-    
-    db.commit()
+    # Every share also counts towards speaks_shares
+    network = "facebook" if kind == 0 else "twitter"
+    counts = await track_engagement(db, complaint.id, current_user.id, [network, "speaks"])
     
-    return {"shares": len(shares)}
\ No newline at end of file
+    return {"shares": counts[network]}
\ No newline at end of file
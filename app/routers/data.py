@@ -1,7 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
-import random
+from typing import AsyncIterator, List, Optional, Tuple
+import json
+from datetime import datetime
+from app.config import settings
 from app.database import get_db
 from app.models.company import Company
 from app.models.complaint import Complaint
@@ -9,6 +12,15 @@ from app.models.reply import Reply
 from app.models.image import Image
 from app.schemas.company import CompanyResponse
 from app.schemas.complaint import ComplaintCreate, ComplaintResponse
+from app.utils.company_stats import company_stats, etag_matches
+from app.utils.export import EXPORT_FORMATS, attach_related, column_keys, column_values, iter_complaint_export
+from app.utils.feed import fan_out_complaint, sync_feed_state
+from app.utils.ingest import ingest_complaint_chunk
+from app.utils.pagination import NEXT_CURSOR_HEADER, encode_cursor, paginate_newest_first
+from app.utils.search import index_complaint
+from app.utils.state_history import record_complaints_started, record_state_change
+from app.utils.stats import record_complaint_created, update_complaint_stats
+from app.utils.streaming import NDJSON_MEDIA_TYPE, gzip_chunks, ndjson_pages_response, wants_ndjson
 
 router = APIRouter(prefix="/api/data", tags=["data"])
 
@@ -18,52 +30,84 @@ async def get_companies(db: Session = Depends(get_db)):
     return companies
 
 @router.get("/companies/{company_id}")
-async def get_company_stats(company_id: int):
-    # Generate random statistics as in the original
-    data_array = [random.uniform(0, 20) for _ in range(12)]
-    
-    random_data = {
-        "dataChart": data_array,
-        "number": random.randint(0, 100),
-        "percentage": f"{random.uniform(0, 100):.2f}%",
-        "replies": random.randint(0, 100000),
-        "votesGained": random.randint(0, 1000),
-        "votesLost": random.randint(0, 1000),
-        "resolved": f"{random.uniform(0, 100):.2f}%",
-        "reimbursed": f"{random.uniform(0, 100):.2f}%",
-        "info": "WeListen score",
-        "score": random.uniform(0, 200)
-    }
-    
-    return random_data
+async def get_company_stats(company_id: int, request: Request, db: Session = Depends(get_db)):
+    """
+    Performance summary of an organization
+    
+    Served from a per-organization cache refreshed from the stats rollups,
+    with an ETag so unchanged summaries cost a 304.
+    """
+    cached = company_stats(db, company_id)
+    if cached is None:
+        raise HTTPException(status_code=404, detail="Company not found")
+    
+    body, etag = cached
+    headers = {"ETag": etag, "Cache-Control": f"max-age={settings.COMPANY_STATS_TTL}"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def _complaints_page(db: Session, size: int, cursor: Optional[str]) -> Tuple[List[dict], Optional[str]]:
+    query = db.query(Complaint)
+    complaints = paginate_newest_first(query, Complaint.created, Complaint.id, size, cursor=cursor)
+    next_cursor = encode_cursor(complaints[-1].created, complaints[-1].id) if len(complaints) == size else None
+    complaint_keys = column_keys(Complaint)
+    return attach_related(db, [column_values(complaint, complaint_keys) for complaint in complaints]), next_cursor
 
 @router.get("/complaints")
-async def get_complaints(db: Session = Depends(get_db)):
-    complaints = db.query(Complaint).all()
-    
-    # Add related data for each complaint
-    result = []
-    for complaint in complaints:
-        complaint_dict = complaint.__dict__.copy()
-        
-        # Get replies
-        replies = db.query(Reply).filter(Reply.complaint_id == complaint.id).all()
-        complaint_dict["replies"] = [reply.__dict__ for reply in replies]
-        
-        # Get images
-        images = db.query(Image).filter(Image.complaint_id == complaint.id).all()
-        complaint_dict["images"] = [image.__dict__ for image in images]
-        
-        # Get company
-        company = db.query(Company).filter(Company.id == complaint.company_id).first()
-        complaint_dict["company"] = company.__dict__ if company else None
-        
-        result.append(complaint_dict)
-    
-    return result
+async def get_complaints(
+    request: Request,
+    response: Response,
+    size: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None),
+    stream: int = Query(0),
+    db: Session = Depends(get_db)
+):
+    """
+    Complaints newest first with their replies, images and company
+    
+    Pages are cursor-paginated (X-Next-Cursor); with stream=1 or an NDJSON
+    Accept header every complaint is streamed, `size` per batch. Either way
+    a page costs four queries however many complaints it holds.
+    """
+    if wants_ndjson(request, stream):
+        return ndjson_pages_response(lambda session, next_cursor: _complaints_page(session, size, next_cursor))
+    
+    complaints, next_cursor = _complaints_page(db, size, cursor)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return complaints
+
+def _export_response(fmt: str, gzip: int, since_id: int, company_id: Optional[int] = None) -> StreamingResponse:
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    
+    chunks = iter_complaint_export(fmt, company_id, since_id, settings.EXPORT_CHUNK_SIZE)
+    filename = f"complaints-{company_id}.{fmt}" if company_id is not None else f"complaints.{fmt}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if gzip:
+        chunks = gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+    media_type = NDJSON_MEDIA_TYPE if fmt == "ndjson" else "text/csv"
+    return StreamingResponse(chunks, media_type=media_type, headers=headers)
+
+@router.get("/complaints/export")
+async def export_complaints(
+    format: str = Query("ndjson"),
+    gzip: int = Query(0),
+    since_id: int = Query(0, ge=0),
+):
+    """
+    Stream every complaint after `since_id` with its replies and images
+    
+    Rows come in id order as NDJSON or CSV (nested lists as JSON cells), so a
+    nightly sync passes the last id it received as `since_id`. gzip=1
+    compresses the stream.
+    """
+    return _export_response(format, gzip, since_id)
 
 @router.post("/complaints/insert")
-async def insert_complaint(complaint_data: dict, db: Session = Depends(get_db)):
+async def insert_complaint(complaint_data: dict, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     complaint = complaint_data.get("complaint", {})
     
     new_complaint = Complaint(
@@ -80,17 +124,101 @@ async def insert_complaint(complaint_data: dict, db: Session = Depends(get_db)):
         angry_level=complaint.get("angryLevel"),
         reimbursement=complaint.get("reimbursement", False),
         reimbursement_amount=complaint.get("reimbursementAmount", 0),
-        waiting_timer=complaint.get("waitingTimer", False)
+        waiting_timer=complaint.get("waitingTimer", False),
+        created=datetime.utcnow()
     )
     
+    record_complaint_created(new_complaint, db)
     db.add(new_complaint)
+    db.flush()
+    fan_out_complaint(db, new_complaint, background_tasks)
+    index_complaint(db, new_complaint)
+    record_complaints_started(db, [new_complaint.id])
     db.commit()
     db.refresh(new_complaint)
     
     return new_complaint
 
+async def _ndjson_payloads(request: Request) -> AsyncIterator:
+    """Decode an NDJSON body line by line as it arrives; undecodable lines yield None"""
+    buffer = b""
+    async for data in request.stream():
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield _decode_line(line)
+    if buffer.strip():
+        yield _decode_line(buffer)
+
+def _decode_line(line: bytes):
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+def _bulk_summary(results: List[dict]) -> dict:
+    created = sum(1 for result in results if result["status"] == "created")
+    return {"created": created, "failed": len(results) - created, "results": results}
+
+@router.post("/complaints/bulk")
+async def bulk_insert_complaints(request: Request, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    """
+    Insert many complaints from a JSON array or an NDJSON body
+    
+    Items use the /complaints/insert format and are inserted in chunks of
+    BULK_INGEST_CHUNK_SIZE, one transaction per chunk. Every item gets a
+    result with its position in the body, its id or its errors. An NDJSON
+    body longer than BULK_INGEST_MAX_LINES is cut off there with a 413 that
+    carries the results of the lines ingested so far.
+    """
+    chunk_size = settings.BULK_INGEST_CHUNK_SIZE
+    results = []
+    
+    if request.headers.get("content-type", "").startswith(NDJSON_MEDIA_TYPE):
+        max_lines = settings.BULK_INGEST_MAX_LINES
+        chunk = []
+        async for payload in _ndjson_payloads(request):
+            if len(results) + len(chunk) == max_lines:
+                if chunk:
+                    results.extend(ingest_complaint_chunk(db, len(results), chunk, background_tasks))
+                raise HTTPException(
+                    status_code=413,
+                    detail={
+                        "message": f"At most {max_lines} lines per NDJSON body, send the rest separately",
+                        **_bulk_summary(results)
+                    }
+                )
+            chunk.append(payload)
+            if len(chunk) == chunk_size:
+                results.extend(ingest_complaint_chunk(db, len(results), chunk, background_tasks))
+                chunk = []
+        if chunk:
+            results.extend(ingest_complaint_chunk(db, len(results), chunk, background_tasks))
+    else:
+        try:
+            payloads = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+        if not isinstance(payloads, list):
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+        if len(payloads) > settings.BULK_INGEST_MAX_ITEMS:
+            raise HTTPException(
+                status_code=413,
+                detail=f"At most {settings.BULK_INGEST_MAX_ITEMS} complaints per array, use NDJSON for more"
+            )
+        for start in range(0, len(payloads), chunk_size):
+            results.extend(ingest_complaint_chunk(db, start, payloads[start:start + chunk_size], background_tasks))
+    
+    return _bulk_summary(results)
+
 @router.post("/complaints/{complaint_id}/edit")
-async def edit_complaint(complaint_id: int, complaint_data: dict, db: Session = Depends(get_db)):
+async def edit_complaint(
+    complaint_id: int,
+    complaint_data: dict,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
     complaint = db.query(Complaint).filter(Complaint.id == complaint_id).first()
     
     if not complaint:
@@ -100,8 +228,14 @@ async def edit_complaint(complaint_id: int, complaint_data: dict, db: Session =
     
     if "description" in update_data:
         complaint.description = update_data["description"]
+        db.flush()
+        index_complaint(db, complaint)
     if "state" in update_data:
+        previous_state = complaint.state
         complaint.state = update_data["state"]
+        record_state_change(db, complaint, previous_state)
+        update_complaint_stats(complaint, db, previous_state)
+        sync_feed_state(db, complaint, previous_state, background_tasks)
     
     db.commit()
     return {"message": "Complaint updated successfully"}
@@ -111,6 +245,16 @@ async def get_complaints_by_company(company_id: int, db: Session = Depends(get_d
     complaints = db.query(Complaint).filter(Complaint.company_id == company_id).all()
     return complaints
 
+@router.get("/complaints/company/{company_id}/export")
+async def export_complaints_by_company(
+    company_id: int,
+    format: str = Query("ndjson"),
+    gzip: int = Query(0),
+    since_id: int = Query(0, ge=0),
+):
+    """Stream the complaints of one company after `since_id`, like /complaints/export"""
+    return _export_response(format, gzip, since_id, company_id)
+
 @router.get("/complaints/user/{user_id}")
 async def get_complaints_by_user(user_id: int, db: Session = Depends(get_db)):
     complaints = db.query(Complaint).filter(Complaint.user_id == user_id).all()
@@ -1,12 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import Dict, List, Optional
+from datetime import datetime
 from app.database import get_db
 from app.models.organization import Organization
 from app.models.user import User
-from app.schemas.organization import OrganizationResponse, OrganizationCreate, OrganizationUpdate
+from app.schemas.organization import OrganizationResponse, OrganizationCreate, OrganizationUpdate, ResponseTimeStage, ScoreHistoryPoint
 from app.utils.auth import get_current_user, get_current_premium_user
+from app.utils.feed import record_follows, record_unfollow
+from app.utils.state_history import response_time_percentiles
 from app.utils.s3 import upload_image_variants
+from app.utils.score_history import RESOLUTIONS, build_data_graph, get_score_history
 
 router = APIRouter(prefix="/api/organizations", tags=["organizations"])
 
@@ -79,7 +83,41 @@ async def get_organization(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Organization not found"
         )
-    return organization
+    return with_data_graph(organization, db)
+
+@router.get("/{organization_id}/score-history", response_model=List[ScoreHistoryPoint])
+async def get_organization_score_history(
+    organization_id: int,
+    from_date: Optional[datetime] = Query(None, alias="from"),
+    to_date: Optional[datetime] = Query(None, alias="to"),
+    resolution: str = Query("day"),
+    db: Session = Depends(get_db)
+):
+    if resolution != "raw" and resolution not in RESOLUTIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"resolution must be one of raw, {', '.join(RESOLUTIONS)}"
+        )
+    
+    return get_score_history(db, organization_id, resolution, from_date, to_date)
+
+@router.get("/{organization_id}/response-times", response_model=Dict[str, ResponseTimeStage])
+async def get_organization_response_times(
+    organization_id: int,
+    percentiles: str = Query("50,90,99"),
+    db: Session = Depends(get_db)
+):
+    try:
+        requested = [float(value) for value in percentiles.split(",") if value.strip()]
+    except ValueError:
+        requested = []
+    if not requested or any(not 0 < value <= 100 for value in requested):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="percentiles must be a comma-separated list of numbers in (0, 100]"
+        )
+    
+    return response_time_percentiles(db, organization_id, requested)
 
 @router.get("/performancedetail/{name}", response_model=OrganizationResponse)
 async def get_organization_by_name(
@@ -92,7 +130,7 @@ async def get_organization_by_name(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Organization not found"
         )
-    return organization
+    return with_data_graph(organization, db)
 
 @router.post("/follow")
 async def follow_organization(
@@ -127,6 +165,7 @@ async def follow_organization(
         })
         
         current_user.follows = follows
+        record_follows(db, current_user.id, [organization_id])
         db.commit()
     
     return {"follows": current_user.follows}
@@ -144,6 +183,7 @@ async def unfollow_organization(
         follow for follow in follows 
         if follow.get("companyId") != organization_id
     ]
+    record_unfollow(db, current_user.id, organization_id)
     
     db.commit()
     return {"follows": current_user.follows}
@@ -191,13 +231,7 @@ async def create_organization(
             "totalResolves": 0,
             "reimbursed": 0,
             "gainedVotes": 0,
-            "lostVotes": 0,
-            "dataGraph": {
-                "day": [0.0] * 12,
-                "days": [0.0] * 31,
-                "month": [0.0] * 12,
-                "year": [0.0] * 12
-            }
+            "lostVotes": 0
         }
     )
     
@@ -232,4 +266,10 @@ async def edit_organization_profile(
     db.commit()
     db.refresh(organization)
     
-    return organization
\ No newline at end of file
+    return organization
+
+def with_data_graph(organization: Organization, db: Session) -> OrganizationResponse:
+    """Organization detail with the legacy stats.dataGraph arrays rebuilt from the score history"""
+    response = OrganizationResponse.model_validate(organization)
+    response.stats = {**(response.stats or {}), "dataGraph": build_data_graph(db, organization.id)}
+    return response
\ No newline at end of file
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 from app.models.complaint import ComplaintState, ComplaintMood
@@ -30,14 +30,39 @@ class ComplaintResponse(ComplaintBase):
     created: datetime
     anonymous: bool
     reimbursement: bool
-    views: Optional[List[int]] = []
-    facebook_shares: Optional[List[int]] = []
-    twitter_shares: Optional[List[int]] = []
-    speaks_shares: Optional[List[int]] = []
+    views_count: int = 0
+    facebook_shares_count: int = 0
+    twitter_shares_count: int = 0
+    speaks_shares_count: int = 0
 
     class Config:
         from_attributes = True
 
 class ComplaintUpdate(BaseModel):
     state: Optional[ComplaintState] = None
-    description: Optional[str] = None
\ No newline at end of file
+    description: Optional[str] = None
+
+class ComplaintIngest(BaseModel):
+    """One item of a bulk ingestion, in the /api/data/complaints/insert format"""
+    company_id: int = Field(alias="companyId")
+    user_id: Optional[int] = Field(None, alias="userId")
+    subject: Optional[str] = None
+    author: Optional[str] = None
+    topic: Optional[str] = None
+    state: ComplaintState = ComplaintState.unresolved
+    mood: Optional[ComplaintMood] = None
+    message: Optional[str] = None
+    description: Optional[str] = None
+    anonymous: bool = False
+    angry_level: Optional[float] = Field(None, alias="angryLevel")
+    reimbursement: bool = False
+    reimbursement_amount: Optional[float] = Field(0, alias="reimbursementAmount")
+    waiting_timer: bool = Field(False, alias="waitingTimer")
+    hashtags: List[str] = []
+
+    class Config:
+        populate_by_name = True
+
+class TrendingHashtag(BaseModel):
+    hashtag: str
+    count: int
\ No newline at end of file
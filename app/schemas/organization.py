@@ -37,4 +37,13 @@ class OrganizationUpdate(BaseModel):
     phone_number_organization: Optional[str] = None
     facebook: Optional[str] = None
     twitter: Optional[str] = None
-    markers: Optional[List[str]] = None
\ No newline at end of file
+    markers: Optional[List[str]] = None
+
+class ScoreHistoryPoint(BaseModel):
+    date: datetime
+    score: float
+    samples: int
+
+class ResponseTimeStage(BaseModel):
+    count: int
+    percentiles: Dict[str, Optional[int]]  # seconds after creation
\ No newline at end of file
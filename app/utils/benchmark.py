@@ -0,0 +1,238 @@
+"""
+Benchmark for the organization stats pipeline
+
+Seeds a database with synthetic organizations, users, complaints and chats,
+then times update_organization_stats, check_crisis_status, the bulk
+recompute, the crisis classification and run_hourly_stats_update. Every
+phase reports wall time split into SQL query time, commit time and the
+remaining Python time, and the results are written as JSON so runs can be
+compared between commits.
+
+Usage:
+    python -m app.utils.benchmark --organizations 2000 --complaints 200000 \
+        --database-url sqlite:///benchmark.db --output benchmark.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import Session
+from app.database import Base, SessionLocal
+from app.models import chat, company, complaint, complaints_history, feed, image, organization, reply, score_history, user
+from app.models.chat import Chat
+from app.models.complaint import Complaint
+from app.models.organization import Organization
+from app.models.user import User
+from app.utils import scheduler
+from app.utils.stats import (
+    check_crisis_status,
+    classify_crisis_organizations,
+    recompute_organization_stats,
+    update_organization_stats,
+)
+
+# Share of complaints per state; resolved/reimbursed complaints stop aging
+STATE_WEIGHTS = {
+    "submitted": 0.15,
+    "opened": 0.15,
+    "responded": 0.10,
+    "unresolved": 0.20,
+    "resolved": 0.30,
+    "reimbursed": 0.10,
+}
+
+class PhaseTimer:
+    """Accumulates SQL and commit time on an engine while a phase runs"""
+
+    def __init__(self, engine):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+        event.listen(engine, "before_cursor_execute", self._before_execute)
+        event.listen(engine, "after_cursor_execute", self._after_execute)
+        event.listen(Session, "before_commit", self._before_commit)
+        event.listen(Session, "after_commit", self._after_commit)
+        event.listen(Session, "after_rollback", self._after_commit)
+
+    def reset(self):
+        self.query_time = 0.0
+        self.commit_time = 0.0
+        self.queries = 0
+        self.commits = 0
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self._local.query_started = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - self._local.query_started
+        with self._lock:
+            self.queries += 1
+            # SQL issued by a flush during commit counts as commit time
+            if not getattr(self._local, "commit_started", None):
+                self.query_time += elapsed
+
+    def _before_commit(self, session):
+        self._local.commit_started = time.perf_counter()
+
+    def _after_commit(self, session):
+        started = getattr(self._local, "commit_started", None)
+        if started is None:
+            return
+        self._local.commit_started = None
+        with self._lock:
+            self.commits += 1
+            self.commit_time += time.perf_counter() - started
+
+    @contextmanager
+    def phase(self, results: Dict, name: str, calls: int = 1):
+        self.reset()
+        started = time.perf_counter()
+        yield
+        wall = time.perf_counter() - started
+        results[name] = {
+            "wall": round(wall, 6),
+            "query": round(self.query_time, 6),
+            "commit": round(self.commit_time, 6),
+            # Query and commit time are summed over worker threads, so this can bottom out at 0
+            "python": round(max(0.0, wall - self.query_time - self.commit_time), 6),
+            "queries": self.queries,
+            "commits": self.commits,
+            "calls": calls,
+        }
+        print(f"{name}: {wall:.3f}s ({self.queries} queries, {self.commits} commits)")
+
+def _insert_batches(db: Session, model, rows, batch_size: int = 5000):
+    for start in range(0, len(rows), batch_size):
+        db.execute(insert(model), rows[start:start + batch_size])
+    db.commit()
+
+def seed(db: Session, organizations: int, users: int, complaints: int, chats: int, rng: random.Random):
+    """Fill an empty database with synthetic data"""
+    now = datetime.utcnow()
+    
+    _insert_batches(db, Organization, [
+        {"name": f"Benchmark Org {i}", "kind": i % 3, "admins": [], "markers": [], "stats": {}, "is_crisis": False}
+        for i in range(organizations)
+    ])
+    org_ids = [org_id for (org_id,) in db.query(Organization.id)]
+    
+    _insert_batches(db, User, [
+        {"name": f"User {i}", "email": f"user{i}@benchmark.local", "password": "x", "follows": [], "payment": {}}
+        for i in range(users)
+    ])
+    user_ids = [user_id for (user_id,) in db.query(User.id)]
+    
+    # A few organizations get most of the complaints
+    org_weights = [rng.paretovariate(1.2) for _ in org_ids]
+    states = list(STATE_WEIGHTS)
+    state_weights = list(STATE_WEIGHTS.values())
+    rows = []
+    for company_id, state in zip(
+        rng.choices(org_ids, weights=org_weights, k=complaints),
+        rng.choices(states, weights=state_weights, k=complaints)
+    ):
+        age = timedelta(days=min(rng.expovariate(1 / 60), 3 * 365), seconds=rng.randint(0, 86399))
+        rows.append({
+            "user_id": rng.choice(user_ids),
+            "company_id": company_id,
+            "topic": "benchmark",
+            "message": "benchmark complaint",
+            "state": state,
+            "created": now - age,
+            "hashtags": [],
+            "state_dates": [],
+        })
+    _insert_batches(db, Complaint, rows)
+    
+    complaint_rows = db.query(Complaint.id, Complaint.company_id, Complaint.user_id).limit(chats * 10).all()
+    _insert_batches(db, Chat, [
+        {"complaint_id": complaint_id, "company_id": company_id, "user_id": user_id, "title": "benchmark"}
+        for complaint_id, company_id, user_id in rng.sample(complaint_rows, min(chats, len(complaint_rows)))
+    ])
+
+def _git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def run(args) -> Dict:
+    engine = create_engine(args.database_url)
+    # The scheduler and its workers open sessions through SessionLocal
+    SessionLocal.configure(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    timer = PhaseTimer(engine)
+    rng = random.Random(args.seed)
+    phases = {}
+    
+    db = SessionLocal()
+    try:
+        if not args.skip_seed:
+            with timer.phase(phases, "seed"):
+                seed(db, args.organizations, args.users, args.complaints, args.chats, rng)
+        
+        org_ids = [org_id for (org_id,) in db.query(Organization.id)]
+        sample = rng.sample(org_ids, min(args.sample, len(org_ids)))
+        
+        with timer.phase(phases, "update_organization_stats", calls=len(sample)):
+            for org_id in sample:
+                update_organization_stats(org_id, db)
+        
+        with timer.phase(phases, "check_crisis_status", calls=len(sample)):
+            for org_id in sample:
+                check_crisis_status(org_id, db)
+        
+        with timer.phase(phases, "recompute_organization_stats"):
+            recompute_organization_stats(db)
+        
+        with timer.phase(phases, "classify_crisis_organizations"):
+            classify_crisis_organizations(db)
+    finally:
+        db.close()
+    
+    with timer.phase(phases, "run_hourly_stats_update"):
+        asyncio.run(scheduler.run_hourly_stats_update())
+    
+    return {
+        "revision": _git_revision(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "database": engine.dialect.name,
+        "parameters": {
+            "organizations": args.organizations,
+            "users": args.users,
+            "complaints": args.complaints,
+            "chats": args.chats,
+            "sample": args.sample,
+            "seed": args.seed,
+            "skip_seed": args.skip_seed,
+        },
+        "phases": phases,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the organization stats pipeline")
+    parser.add_argument("--database-url", default="sqlite:///benchmark.db")
+    parser.add_argument("--organizations", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--complaints", type=int, default=100000)
+    parser.add_argument("--chats", type=int, default=10000)
+    parser.add_argument("--sample", type=int, default=50, help="organizations timed on the per-org paths")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-seed", action="store_true", help="reuse an already seeded database")
+    parser.add_argument("--output", default="benchmark.json")
+    args = parser.parse_args()
+    
+    results = run(args)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
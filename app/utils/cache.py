@@ -0,0 +1,76 @@
+"""
+In-process TTL cache with request coalescing
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+class _Load:
+    def __init__(self, generation: int):
+        self.generation = generation
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+class TTLCache:
+    """
+    Thread-safe cache whose entries expire after `ttl` seconds
+    
+    Concurrent misses on the same key are coalesced: one caller runs the
+    loader and the others wait for its result instead of hitting the
+    database too. A load that was running when clear() was called is
+    returned to its callers but not stored.
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: Dict[Hashable, Tuple[float, Any]] = {}
+        self._loading: Dict[Hashable, _Load] = {}
+        self._generation = 0
+
+    def get(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Cached value of `key`, calling `loader` to fill a missing or expired entry"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1]
+            load = self._loading.get(key)
+            owner = load is None
+            if owner:
+                load = self._loading[key] = _Load(self._generation)
+        
+        if not owner:
+            load.done.wait()
+            if load.error is not None:
+                raise load.error
+            return load.value
+        
+        try:
+            load.value = loader()
+        except BaseException as e:
+            load.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._loading[key]
+                if load.error is None and load.generation == self._generation:
+                    self._store(key, load.value)
+            load.done.set()
+        return load.value
+
+    def _store(self, key: Hashable, value: Any):
+        now = time.monotonic()
+        if key not in self._entries and len(self._entries) >= self.max_entries:
+            for stale in [k for k, (expires, _) in self._entries.items() if expires <= now]:
+                del self._entries[stale]
+            if len(self._entries) >= self.max_entries:
+                del self._entries[next(iter(self._entries))]
+        self._entries[key] = (now + self.ttl, value)
+
+    def clear(self):
+        """Drop every entry and keep loads already running from being stored"""
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
@@ -0,0 +1,79 @@
+"""
+Company performance summaries for the legacy /api/data/companies/{id} endpoint
+
+A summary is assembled from rollups the stats pipeline already maintains:
+the counters in Organization.stats and this year's monthly score rollups.
+It is cached per organization as a serialized body with its ETag, so a poll
+is a dictionary lookup and an unchanged summary can be answered with 304.
+"""
+import hashlib
+import json
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models.organization import Organization
+from app.models.score_history import ScoreRollup
+from app.utils.cache import TTLCache
+from app.utils.score_history import bucket_start
+
+company_stats_cache = TTLCache(settings.COMPANY_STATS_TTL, max_entries=settings.COMPANY_STATS_MAX_ENTRIES)
+
+def _percentage(value: float) -> str:
+    return f"{value:.2f}%"
+
+def _monthly_scores(db: Session, organization_id: int, today: datetime) -> List[float]:
+    """Average score of every month of this year, 0 for months without samples"""
+    chart = [0.0] * 12
+    rows = db.query(ScoreRollup.bucket_start, ScoreRollup.score_sum, ScoreRollup.samples).filter(
+        ScoreRollup.organization_id == organization_id,
+        ScoreRollup.resolution == "month",
+        ScoreRollup.bucket_start >= bucket_start("year", today)
+    )
+    for start_date, score_sum, samples in rows:
+        chart[start_date.month - 1] = round(score_sum / samples, 2) if samples else 0.0
+    return chart
+
+def build_company_stats(db: Session, organization_id: int) -> Optional[Dict]:
+    """Performance summary of one organization, None if it does not exist"""
+    row = db.query(Organization.stats).filter(Organization.id == organization_id).first()
+    if row is None:
+        return None
+    
+    stats = row.stats or {}
+    total = stats.get("complaintsCounter", 0)
+    reimbursed = stats.get("reimbursed", 0)
+    return {
+        "dataChart": _monthly_scores(db, organization_id, datetime.utcnow()),
+        "number": total,
+        "percentage": _percentage(stats.get("responseRate", 0)),
+        "replies": stats.get("replies", 0),
+        "votesGained": stats.get("gainedVotes", 0),
+        "votesLost": stats.get("lostVotes", 0),
+        "resolved": _percentage(stats.get("resolveRate", 0)),
+        "reimbursed": _percentage(reimbursed / total * 100 if total else 0),
+        "info": "WeListen score",
+        "score": stats.get("score", 100)
+    }
+
+def company_stats(db: Session, organization_id: int) -> Optional[Tuple[bytes, str]]:
+    """
+    Cached JSON body and ETag of an organization's summary
+    
+    Unknown ids are cached as None too, so polling them stays cheap.
+    """
+    def load():
+        summary = build_company_stats(db, organization_id)
+        if summary is None:
+            return None
+        body = json.dumps(summary, separators=(",", ":")).encode()
+        return body, f'"{hashlib.sha1(body).hexdigest()}"'
+    
+    return company_stats_cache.get(organization_id, load)
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header covers `etag`, comparing weakly as RFC 9110 requires"""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in [candidate.removeprefix("W/") for candidate in candidates]
@@ -0,0 +1,300 @@
+"""
+Complaint views and shares
+
+Every (complaint, kind, user) engagement is one row in complaint_engagements,
+deduplicated by its primary key, and the complaint keeps a counter per kind
+so responses carry counts instead of lists of user ids.
+
+While the app is running, engagements go through a write-behind buffer:
+endpoints enqueue them and return, and a background task writes each
+deduplicated batch in one transaction, with a fixed number of statements
+however large the batch is. Writes are idempotent, so a batch that is
+retried after a failure does not count anything twice.
+"""
+import asyncio
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy import case, func, or_, tuple_, update
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models.complaint import Complaint
+from app.models.engagement import ComplaintEngagement
+from app.utils.sql import insert_ignore
+
+KIND_COUNTERS = {
+    "view": Complaint.views_count,
+    "facebook": Complaint.facebook_shares_count,
+    "twitter": Complaint.twitter_shares_count,
+    "speaks": Complaint.speaks_shares_count,
+}
+
+# JSON list columns the engagements used to live in
+LEGACY_COLUMNS = {
+    "view": Complaint.views,
+    "facebook": Complaint.facebook_shares,
+    "twitter": Complaint.twitter_shares,
+    "speaks": Complaint.speaks_shares,
+}
+
+def engagement_counts(db: Session, complaint_id: int) -> Dict[str, int]:
+    row = db.query(*KIND_COUNTERS.values()).filter(Complaint.id == complaint_id).one()
+    return dict(zip(KIND_COUNTERS, row))
+
+def _count_engagements(db: Session, complaint_ids: List[int]) -> Dict[int, Counter]:
+    """Engagement rows per complaint and kind, with one grouped COUNT"""
+    counts = {complaint_id: Counter() for complaint_id in complaint_ids}
+    for complaint_id, kind, count in db.query(
+        ComplaintEngagement.complaint_id, ComplaintEngagement.kind, func.count()
+    ).filter(ComplaintEngagement.complaint_id.in_(complaint_ids)).group_by(
+        ComplaintEngagement.complaint_id, ComplaintEngagement.kind
+    ):
+        counts[complaint_id][kind] = count
+    return counts
+
+def _update_counters(db: Session, counts: Dict[int, Counter], increment: bool):
+    """Add `counts` to the complaints' counters, or set the counters to them, with one UPDATE"""
+    values = {}
+    for kind, column in KIND_COUNTERS.items():
+        if increment:
+            whens = {complaint_id: kinds[kind] for complaint_id, kinds in counts.items() if kinds[kind]}
+            if whens:
+                values[column] = column + case(whens, value=Complaint.id, else_=0)
+        else:
+            whens = {complaint_id: kinds[kind] for complaint_id, kinds in counts.items()}
+            values[column] = case(whens, value=Complaint.id, else_=column)
+    if values:
+        db.execute(
+            update(Complaint).where(Complaint.id.in_(list(counts))).values(values),
+            execution_options={"synchronize_session": False}
+        )
+
+def _apply_engagements(db: Session, engagements: Iterable[Tuple[int, str, int]]):
+    """
+    Insert (complaint_id, kind, user_id) rows and bump the counters of the new ones
+    
+    Keys already stored are read with one query, the new rows written with
+    one multi-row INSERT IGNORE and the counters moved with one UPDATE. If a
+    concurrent writer stored some of the same rows in between, the touched
+    complaints are recounted instead.
+    """
+    keys = set(engagements)
+    if not keys:
+        return
+    
+    existing = set(db.query(
+        ComplaintEngagement.complaint_id, ComplaintEngagement.kind, ComplaintEngagement.user_id
+    ).filter(
+        tuple_(ComplaintEngagement.complaint_id, ComplaintEngagement.kind, ComplaintEngagement.user_id).in_(list(keys))
+    ))
+    new = sorted(keys - {tuple(row) for row in existing})
+    if not new:
+        return
+    
+    added = defaultdict(Counter)
+    for complaint_id, kind, _ in new:
+        added[complaint_id][kind] += 1
+    
+    inserted = insert_ignore(db, ComplaintEngagement, [
+        {"complaint_id": complaint_id, "kind": kind, "user_id": user_id} for complaint_id, kind, user_id in new
+    ])
+    if inserted == len(new):
+        _update_counters(db, added, increment=True)
+    else:
+        _update_counters(db, _count_engagements(db, list(added)), increment=False)
+
+def record_engagement(db: Session, complaint_id: int, user_id: int, kinds: Iterable[str]) -> Dict[str, int]:
+    """
+    Record that `user_id` engaged with a complaint once per kind and return
+    the complaint's counts. Repeat engagements are ignored. Does not commit.
+    """
+    _apply_engagements(db, [(complaint_id, kind, user_id) for kind in kinds])
+    return engagement_counts(db, complaint_id)
+
+def _write_engagements(engagements: List[Tuple[int, str, int]]):
+    db = SessionLocal()
+    try:
+        _apply_engagements(db, sorted(engagements))
+        db.commit()
+    finally:
+        db.close()
+
+class EngagementBuffer:
+    """
+    Bounded queue of engagements flushed in batches by a background task
+    
+    A batch is written when ENGAGEMENT_FLUSH_SIZE distinct engagements are
+    pending or ENGAGEMENT_FLUSH_INTERVAL seconds have passed. A failed batch
+    is retried with exponential backoff, up to ENGAGEMENT_MAX_BACKOFF seconds
+    apart, before anything else is read. When the queue is full, e.g. while
+    the database is down, submit waits up to submit_timeout seconds for room
+    and then answers 503, so clients back off instead of losing events.
+    """
+
+    def __init__(self, max_queue: int, flush_size: int, flush_interval: float, max_backoff: float, submit_timeout: float):
+        self.max_queue = max_queue
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+        self.submit_timeout = submit_timeout
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._pending: Set[Tuple[int, str, int]] = set()
+        # (kind, user_id) submitted per complaint and not written yet
+        self._unwritten: Dict[int, Set[Tuple[str, int]]] = defaultdict(set)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run())
+
+    async def submit(self, complaint_id: int, user_id: int, kinds: Iterable[str]):
+        for kind in kinds:
+            try:
+                await asyncio.wait_for(self._queue.put((complaint_id, kind, user_id)), timeout=self.submit_timeout)
+            except asyncio.TimeoutError:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many pending engagements, try again later",
+                    headers={"Retry-After": str(max(int(self.flush_interval), 1))}
+                )
+            self._unwritten[complaint_id].add((kind, user_id))
+
+    def unwritten(self, complaint_id: int) -> Set[Tuple[str, int]]:
+        """(kind, user_id) of the complaint's engagements still queued or pending"""
+        return set(self._unwritten.get(complaint_id, ()))
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        while True:
+            try:
+                engagement = await asyncio.wait_for(self._queue.get(), timeout=max(deadline - loop.time(), 0))
+                self._pending.add(engagement)
+            except asyncio.TimeoutError:
+                pass
+            
+            if len(self._pending) >= self.flush_size or loop.time() >= deadline:
+                backoff = self.flush_interval
+                while not await self._flush():
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, self.max_backoff)
+                deadline = loop.time() + self.flush_interval
+
+    async def _flush(self) -> bool:
+        if not self._pending:
+            return True
+        batch = list(self._pending)
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, _write_engagements, batch)
+        except Exception as e:
+            print(f"Engagement flush of {len(batch)} events failed: {e}")
+            return False
+        self._pending.difference_update(batch)
+        for complaint_id, kind, user_id in batch:
+            unwritten = self._unwritten.get(complaint_id)
+            if unwritten is not None:
+                unwritten.discard((kind, user_id))
+                if not unwritten:
+                    del self._unwritten[complaint_id]
+        return True
+
+    async def stop(self):
+        """Stop the background task and write whatever is still queued"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        
+        while not self._queue.empty():
+            self._pending.add(self._queue.get_nowait())
+        if not await self._flush():
+            print(f"Dropped {len(self._pending)} engagement events on shutdown")
+
+engagement_buffer = EngagementBuffer(
+    settings.ENGAGEMENT_QUEUE_SIZE,
+    settings.ENGAGEMENT_FLUSH_SIZE,
+    settings.ENGAGEMENT_FLUSH_INTERVAL,
+    settings.ENGAGEMENT_MAX_BACKOFF,
+    settings.ENGAGEMENT_SUBMIT_TIMEOUT
+)
+
+async def track_engagement(db: Session, complaint_id: int, user_id: int, kinds: List[str]) -> Dict[str, int]:
+    """
+    Queue engagements on the write-behind buffer and return the complaint's
+    counts including the queued engagements that are not stored yet, so the
+    caller sees their own view; without a running buffer they are written
+    right away
+    """
+    if engagement_buffer.running:
+        await engagement_buffer.submit(complaint_id, user_id, kinds)
+        counts = engagement_counts(db, complaint_id)
+        unwritten = engagement_buffer.unwritten(complaint_id)
+        if unwritten:
+            stored = set(db.query(ComplaintEngagement.kind, ComplaintEngagement.user_id).filter(
+                ComplaintEngagement.complaint_id == complaint_id,
+                tuple_(ComplaintEngagement.kind, ComplaintEngagement.user_id).in_(list(unwritten))
+            ))
+            for kind, _ in unwritten - {tuple(row) for row in stored}:
+                counts[kind] += 1
+        return counts
+    
+    counts = record_engagement(db, complaint_id, user_id, kinds)
+    db.commit()
+    return counts
+
+def import_legacy_engagement(db: Session, chunk_size: int = 1000) -> int:
+    """
+    Move the legacy JSON lists into complaint_engagements, recount the
+    counters and clear the lists; returns the number of complaints migrated
+    """
+    has_legacy = or_(*(column.isnot(None) for column in LEGACY_COLUMNS.values()))
+    migrated = 0
+    last_id = 0
+    while True:
+        rows = db.query(Complaint.id, *LEGACY_COLUMNS.values()).filter(
+            Complaint.id > last_id, has_legacy
+        ).order_by(Complaint.id).limit(chunk_size).all()
+        if not rows:
+            return migrated
+        
+        complaint_ids = [row[0] for row in rows]
+        engagements = [
+            {"complaint_id": row[0], "kind": kind, "user_id": user_id}
+            for row in rows
+            for kind, user_ids in zip(LEGACY_COLUMNS, row[1:])
+            for user_id in set(user_ids or [])
+        ]
+        for start in range(0, len(engagements), 5000):
+            insert_ignore(db, ComplaintEngagement, engagements[start:start + 5000])
+        
+        counts = _count_engagements(db, complaint_ids)
+        db.execute(update(Complaint), [
+            {
+                "id": complaint_id,
+                **{column.key: kinds[kind] for kind, column in KIND_COUNTERS.items()},
+                **{column.key: None for column in LEGACY_COLUMNS.values()}
+            }
+            for complaint_id, kinds in counts.items()
+        ])
+        db.commit()
+        
+        migrated += len(rows)
+        last_id = complaint_ids[-1]
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+    
+    session = SessionLocal()
+    try:
+        print(f"Migrated engagement of {import_legacy_engagement(session)} complaints")
+    finally:
+        session.close()
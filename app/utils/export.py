@@ -0,0 +1,116 @@
+"""
+Complaint exports
+
+Complaints are read in id order with a server-side cursor, `chunk_size` rows
+at a time, and each chunk gets its replies and images with one batched
+lookup. Rows are written out as NDJSON or CSV as soon as their chunk is
+complete, so a full dump never sits in memory, and `since_id` resumes an
+export after the last id a previous run received.
+"""
+import csv
+import io
+import json
+from collections import defaultdict
+from typing import Dict, Iterator, List, Optional
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import inspect as sa_inspect, select
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models.company import Company
+from app.models.complaint import Complaint
+from app.models.image import Image
+from app.models.reply import Reply
+
+EXPORT_FORMATS = ("ndjson", "csv")
+
+def column_keys(model) -> List[str]:
+    """Attribute names of the columns of `model`, leaving out deferred legacy columns"""
+    return [attr.key for attr in sa_inspect(model).column_attrs if not attr.deferred]
+
+def column_values(row, keys: List[str]) -> Dict:
+    return {key: getattr(row, key) for key in keys}
+
+def attach_related(db: Session, complaints: List[Dict], with_company: bool = True) -> List[Dict]:
+    """Add replies, images and optionally the company to complaint dicts, with one query each"""
+    complaint_ids = [complaint["id"] for complaint in complaints]
+    if not complaint_ids:
+        return complaints
+    
+    replies = defaultdict(list)
+    reply_keys = column_keys(Reply)
+    for reply in db.execute(select(Reply).where(Reply.complaint_id.in_(complaint_ids)).order_by(Reply.id)).scalars():
+        replies[reply.complaint_id].append(column_values(reply, reply_keys))
+    
+    images = defaultdict(list)
+    image_keys = column_keys(Image)
+    for image in db.execute(select(Image).where(Image.complaint_id.in_(complaint_ids)).order_by(Image.id)).scalars():
+        images[image.complaint_id].append(column_values(image, image_keys))
+    
+    for complaint in complaints:
+        complaint["replies"] = replies[complaint["id"]]
+        complaint["images"] = images[complaint["id"]]
+    
+    if with_company:
+        company_ids = {complaint["company_id"] for complaint in complaints}
+        company_keys = column_keys(Company)
+        companies = {
+            company.id: column_values(company, company_keys)
+            for company in db.execute(select(Company).where(Company.id.in_(company_ids))).scalars()
+        }
+        for complaint in complaints:
+            complaint["company"] = companies.get(complaint["company_id"])
+    
+    # The lookups are only needed for this chunk
+    db.expunge_all()
+    return complaints
+
+def _csv_cell(value):
+    if isinstance(value, (list, dict)):
+        return json.dumps(jsonable_encoder(value))
+    return jsonable_encoder(value)
+
+def _encode_chunk(rows: List[Dict], fmt: str, header: Optional[List[str]]) -> bytes:
+    if fmt == "ndjson":
+        return b"".join(json.dumps(jsonable_encoder(row)).encode() + b"\n" for row in rows)
+    
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(header)
+    for row in rows:
+        writer.writerow([_csv_cell(value) for value in row.values()])
+    return buffer.getvalue().encode()
+
+def iter_complaint_export(
+    fmt: str,
+    company_id: Optional[int] = None,
+    since_id: int = 0,
+    chunk_size: int = 1000
+) -> Iterator[bytes]:
+    """
+    Encoded export of the complaints after `since_id`, one chunk at a time
+    
+    The server-side cursor holds its own connection for the whole export,
+    so the per-chunk lookups run on a second session.
+    """
+    keys = column_keys(Complaint)
+    query = select(*[getattr(Complaint, key) for key in keys]).where(Complaint.id > since_id).order_by(Complaint.id)
+    if company_id is not None:
+        query = query.where(Complaint.company_id == company_id)
+    
+    reader = SessionLocal()
+    db = SessionLocal()
+    try:
+        result = reader.execute(query.execution_options(yield_per=chunk_size))
+        header = keys + ["replies", "images"] if fmt == "csv" else None
+        for rows in result.partitions():
+            complaints = attach_related(db, [row._asdict() for row in rows], with_company=False)
+            yield _encode_chunk(complaints, fmt, header)
+            header = None
+        
+        # An empty CSV export still gets its header row
+        if header:
+            yield _encode_chunk([], fmt, header)
+    finally:
+        reader.close()
+        db.close()
@@ -0,0 +1,335 @@
+"""
+Materialized per-user complaint feed
+
+New complaints are fanned out on write into feed_entries for every follower
+of their organization, so /myfeed is a bounded indexed read. Up to
+FEED_FANOUT_BATCH_SIZE entries are written in the request; complaints of
+organizations with more followers are fanned out by a background task, one
+batch of followers per transaction. Organizations with more than
+FEED_FANOUT_MAX_FOLLOWERS followers are not fanned out; their complaints
+are pulled at read time and merged in. Entries leave the feed when the
+complaint moves out of submitted/opened/responded.
+
+Feeds are capped at FEED_MAX_ENTRIES as entries are written: feed_sizes
+keeps an upper bound of each feed's length, and a feed that goes 10% over
+the cap is trimmed back to it.
+"""
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from fastapi import BackgroundTasks
+from sqlalchemy import func, insert, literal, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models.complaint import Complaint
+from app.models.feed import FeedEntry, FeedSize, OrganizationFollower
+from app.models.user import User
+from app.utils.cache import TTLCache
+from app.utils.pagination import before_cursor, encode_cursor, newest_first
+from app.utils.sql import insert_ignore, upsert_increment
+
+FEED_STATES = ["submitted", "opened", "responded"]
+
+_follower_counts_cache = TTLCache(settings.FEED_HOT_ORGS_TTL, max_entries=1)
+
+def _state_value(state) -> Optional[str]:
+    return getattr(state, "value", state)
+
+def _large_organizations(db: Session) -> Dict[int, int]:
+    """Follower counts of organizations with over FEED_FANOUT_BATCH_SIZE followers, cached for FEED_HOT_ORGS_TTL seconds"""
+    def load():
+        return dict(
+            db.query(OrganizationFollower.organization_id, func.count()).group_by(
+                OrganizationFollower.organization_id
+            ).having(func.count() > settings.FEED_FANOUT_BATCH_SIZE).all()
+        )
+    
+    return _follower_counts_cache.get("large", load)
+
+def hot_organizations(db: Session) -> Set[int]:
+    """Organizations with too many followers to fan out to"""
+    return {
+        org_id for org_id, followers in _large_organizations(db).items()
+        if followers > settings.FEED_FANOUT_MAX_FOLLOWERS
+    }
+
+def _trim_threshold() -> int:
+    return settings.FEED_MAX_ENTRIES + max(settings.FEED_MAX_ENTRIES // 10, 1)
+
+def _trim_feeds(db: Session, user_ids: Iterable[int]):
+    """Drop the entries past FEED_MAX_ENTRIES of the feeds of `user_ids`. Does not commit."""
+    cap = settings.FEED_MAX_ENTRIES
+    for user_id in user_ids:
+        cutoff = db.query(FeedEntry.created, FeedEntry.complaint_id).filter(
+            FeedEntry.user_id == user_id
+        ).order_by(*newest_first(FeedEntry.created, FeedEntry.complaint_id)).offset(cap - 1).first()
+        if cutoff is None:
+            entries = db.query(func.count()).select_from(FeedEntry).filter(FeedEntry.user_id == user_id).scalar()
+        else:
+            db.query(FeedEntry).filter(
+                FeedEntry.user_id == user_id,
+                before_cursor(FeedEntry.created, FeedEntry.complaint_id, encode_cursor(*cutoff))
+            ).delete(synchronize_session=False)
+            entries = cap
+        db.query(FeedSize).filter(FeedSize.user_id == user_id).update(
+            {FeedSize.entries: entries}, synchronize_session=False
+        )
+
+def _count_entries(db: Session, added: Dict[int, int]):
+    """Raise the feed sizes of users who got new entries and trim the feeds that went over the cap. Does not commit."""
+    if not added:
+        return
+    # Sorted so concurrent fan-outs lock the size rows in the same order
+    upsert_increment(
+        db, FeedSize, [{"user_id": user_id, "entries": count} for user_id, count in sorted(added.items())],
+        ["user_id"], ["entries"]
+    )
+    over_cap = [
+        user_id for (user_id,) in db.query(FeedSize.user_id).filter(
+            FeedSize.user_id.in_(list(added)),
+            FeedSize.entries > _trim_threshold()
+        )
+    ]
+    _trim_feeds(db, over_cap)
+
+def _add_entries(db: Session, rows: List[Dict]):
+    """Insert feed entries FEED_FANOUT_BATCH_SIZE rows at a time and cap the feeds they land in. Does not commit."""
+    batch_size = settings.FEED_FANOUT_BATCH_SIZE
+    for start in range(0, len(rows), batch_size):
+        insert_ignore(db, FeedEntry, rows[start:start + batch_size])
+    _count_entries(db, Counter(row["user_id"] for row in rows))
+
+def _entry(user_id: int, complaint) -> Dict:
+    return {
+        "user_id": user_id, "complaint_id": complaint.id,
+        "company_id": complaint.company_id, "created": complaint.created
+    }
+
+def record_follows(db: Session, user_id: int, organization_ids: Iterable[int]):
+    """
+    Record that `user_id` follows `organization_ids` and seed the user's
+    feed with their newest complaints. Does not commit.
+    """
+    organization_ids = {org_id for org_id in organization_ids if org_id is not None}
+    if not organization_ids:
+        return
+    # Following an organization twice is a no-op rather than a key conflict
+    insert_ignore(db, OrganizationFollower, [
+        {"organization_id": org_id, "user_id": user_id} for org_id in sorted(organization_ids)
+    ])
+    
+    fanned_out = organization_ids - hot_organizations(db)
+    if not fanned_out:
+        return
+    already_in_feed = select(FeedEntry.complaint_id).where(FeedEntry.user_id == user_id)
+    newest = select(
+        literal(user_id), Complaint.id, Complaint.company_id, Complaint.created
+    ).where(
+        Complaint.company_id.in_(fanned_out),
+        Complaint.state.in_(FEED_STATES),
+        Complaint.id.not_in(already_in_feed)
+    ).order_by(Complaint.created.desc(), Complaint.id.desc()).limit(settings.FEED_MAX_ENTRIES)
+    seeded = db.execute(insert(FeedEntry).from_select(["user_id", "complaint_id", "company_id", "created"], newest))
+    _count_entries(db, {user_id: seeded.rowcount})
+
+def record_unfollow(db: Session, user_id: int, organization_id: int):
+    """Remove a follow and the organization's complaints from the user's feed. Does not commit."""
+    db.query(OrganizationFollower).filter(
+        OrganizationFollower.organization_id == organization_id,
+        OrganizationFollower.user_id == user_id
+    ).delete(synchronize_session=False)
+    removed = db.query(FeedEntry).filter(
+        FeedEntry.user_id == user_id,
+        FeedEntry.company_id == organization_id
+    ).delete(synchronize_session=False)
+    if removed:
+        db.query(FeedSize).filter(FeedSize.user_id == user_id).update(
+            {FeedSize.entries: FeedSize.entries - removed}, synchronize_session=False
+        )
+
+def fan_out_complaint(db: Session, complaint: Complaint, background_tasks: BackgroundTasks):
+    """Copy a complaint into its organization's followers' feeds"""
+    fan_out_complaints(db, [complaint], background_tasks)
+
+def fan_out_complaints(db: Session, complaints: Iterable[Complaint], background_tasks: BackgroundTasks):
+    """
+    Copy complaints into their organizations' followers' feeds
+    
+    Complaints are fanned out in the request while they add up to at most
+    FEED_FANOUT_BATCH_SIZE entries; the others are handed to a background
+    task that runs after the response. Complaints of hot organizations are
+    left to the pull path. The complaints must already be flushed. Does not
+    commit.
+    """
+    large = _large_organizations(db)
+    hot = hot_organizations(db)
+    eligible = [
+        complaint for complaint in complaints
+        if _state_value(complaint.state) in FEED_STATES and complaint.company_id not in hot
+    ]
+    if not eligible:
+        return
+    
+    small_orgs = {complaint.company_id for complaint in eligible} - set(large)
+    followers = defaultdict(list)
+    if small_orgs:
+        for org_id, user_id in db.query(OrganizationFollower.organization_id, OrganizationFollower.user_id).filter(
+            OrganizationFollower.organization_id.in_(small_orgs)
+        ):
+            followers[org_id].append(user_id)
+    
+    budget = settings.FEED_FANOUT_BATCH_SIZE
+    immediate = []
+    deferred = []
+    for complaint in eligible:
+        user_ids = followers[complaint.company_id]
+        if complaint.company_id in large or len(user_ids) > budget:
+            deferred.append(complaint.id)
+        elif user_ids:
+            budget -= len(user_ids)
+            immediate.append(complaint)
+    
+    if immediate:
+        # Creation times are SQL defaults, which the flush does not load
+        fanned_out = db.query(Complaint.id, Complaint.company_id, Complaint.created).filter(
+            Complaint.id.in_([complaint.id for complaint in immediate])
+        ).all()
+        _add_entries(db, [
+            _entry(user_id, complaint) for complaint in fanned_out for user_id in followers[complaint.company_id]
+        ])
+    if deferred:
+        background_tasks.add_task(fan_out_in_background, deferred)
+
+def fan_out_in_background(complaint_ids: List[int]):
+    """Fan complaints out with a session of its own, committing every FEED_FANOUT_BATCH_SIZE followers"""
+    db = SessionLocal()
+    try:
+        hot = hot_organizations(db)
+        complaints = db.query(Complaint.id, Complaint.company_id, Complaint.created).filter(
+            Complaint.id.in_(complaint_ids),
+            Complaint.state.in_(FEED_STATES)
+        ).all()
+        for complaint in complaints:
+            if complaint.company_id in hot:
+                continue
+            last_user_id = 0
+            while True:
+                user_ids = [
+                    user_id for (user_id,) in db.query(OrganizationFollower.user_id).filter(
+                        OrganizationFollower.organization_id == complaint.company_id,
+                        OrganizationFollower.user_id > last_user_id
+                    ).order_by(OrganizationFollower.user_id).limit(settings.FEED_FANOUT_BATCH_SIZE)
+                ]
+                if not user_ids:
+                    break
+                _add_entries(db, [_entry(user_id, complaint) for user_id in user_ids])
+                db.commit()
+                last_user_id = user_ids[-1]
+    except SQLAlchemyError as e:
+        db.rollback()
+        print(f"Feed fan-out of complaints {complaint_ids} failed: {e}")
+    finally:
+        db.close()
+
+def sync_feed_state(db: Session, complaint: Complaint, previous_state, background_tasks: BackgroundTasks):
+    """Add or drop a complaint's feed entries when its state crosses the feed states. Does not commit."""
+    was_in_feed = _state_value(previous_state) in FEED_STATES
+    is_in_feed = _state_value(complaint.state) in FEED_STATES
+    
+    if was_in_feed and not is_in_feed:
+        db.query(FeedEntry).filter(FeedEntry.complaint_id == complaint.id).delete(synchronize_session=False)
+    elif is_in_feed and not was_in_feed:
+        db.flush()
+        fan_out_complaint(db, complaint, background_tasks)
+
+def load_feed(
+    db: Session,
+    user: User,
+    size: int,
+    page: int = 0,
+    cursor: Optional[str] = None
+) -> Tuple[List[Complaint], Optional[str]]:
+    """
+    One page of a user's feed, newest first, and the cursor of the next page
+    
+    Merges the materialized entries with complaints pulled from the hot
+    organizations the user follows. A complaint found both ways, fanned out
+    before its organization turned hot, is listed once. Without a cursor the
+    legacy `page` row offset is applied to the merged feed.
+    """
+    limit = size if cursor else page + size
+    
+    entries = db.query(FeedEntry.created, FeedEntry.complaint_id).filter(FeedEntry.user_id == user.id)
+    if cursor:
+        entries = entries.filter(before_cursor(FeedEntry.created, FeedEntry.complaint_id, cursor))
+    candidates = {
+        row_id: created
+        for created, row_id in entries.order_by(*newest_first(FeedEntry.created, FeedEntry.complaint_id)).limit(limit)
+    }
+    
+    followed = {follow.get("companyId") for follow in (user.follows or [])}
+    pulled_orgs = hot_organizations(db) & followed
+    if pulled_orgs:
+        pulled = db.query(Complaint.created, Complaint.id).filter(
+            Complaint.company_id.in_(pulled_orgs),
+            Complaint.state.in_(FEED_STATES)
+        )
+        if cursor:
+            pulled = pulled.filter(before_cursor(Complaint.created, Complaint.id, cursor))
+        for created, row_id in pulled.order_by(*newest_first(Complaint.created, Complaint.id)).limit(limit):
+            candidates.setdefault(row_id, created)
+    
+    merged = sorted(((created, row_id) for row_id, created in candidates.items()), reverse=True)
+    selected = merged[:size] if cursor else merged[page:page + size]
+    
+    complaints = {
+        complaint.id: complaint
+        for complaint in db.query(Complaint).filter(Complaint.id.in_([row_id for _, row_id in selected]))
+    }
+    ordered = [complaints[row_id] for _, row_id in selected if row_id in complaints]
+    
+    next_cursor = encode_cursor(*selected[-1]) if len(selected) == size else None
+    return ordered, next_cursor
+
+def backfill_feeds(db: Session):
+    """
+    Build organization_followers from User.follows, seed feed_entries with
+    the current feed-state complaints of non-hot organizations and cap them
+    """
+    db.query(FeedEntry).delete(synchronize_session=False)
+    db.query(FeedSize).delete(synchronize_session=False)
+    db.query(OrganizationFollower).delete(synchronize_session=False)
+    for user_id, follows in db.query(User.id, User.follows).yield_per(1000):
+        organization_ids = {follow.get("companyId") for follow in (follows or [])} - {None}
+        if organization_ids:
+            db.execute(insert(OrganizationFollower), [
+                {"organization_id": org_id, "user_id": user_id} for org_id in organization_ids
+            ])
+    db.commit()
+    
+    _follower_counts_cache.clear()
+    hot = hot_organizations(db)
+    seeded = select(
+        OrganizationFollower.user_id, Complaint.id, Complaint.company_id, Complaint.created
+    ).join(
+        Complaint, Complaint.company_id == OrganizationFollower.organization_id
+    ).where(Complaint.state.in_(FEED_STATES))
+    if hot:
+        seeded = seeded.where(~Complaint.company_id.in_(hot))
+    db.execute(insert(FeedEntry).from_select(["user_id", "complaint_id", "company_id", "created"], seeded))
+    
+    sizes = select(FeedEntry.user_id, func.count()).group_by(FeedEntry.user_id)
+    db.execute(insert(FeedSize).from_select(["user_id", "entries"], sizes))
+    _trim_feeds(db, [
+        user_id for (user_id,) in db.query(FeedSize.user_id).filter(FeedSize.entries > settings.FEED_MAX_ENTRIES)
+    ])
+    db.commit()
+
+if __name__ == "__main__":
+    session = SessionLocal()
+    try:
+        backfill_feeds(session)
+        print("Feeds backfilled")
+    finally:
+        session.close()
@@ -0,0 +1,128 @@
+"""
+Bulk complaint ingestion
+
+Payloads are validated and inserted one chunk at a time, each chunk in its
+own transaction with a single multi-row INSERT, and stats, crisis flags and
+feeds are updated once per chunk instead of once per complaint.
+"""
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List
+from fastapi import BackgroundTasks
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from app.models.complaint import Complaint
+from app.models.organization import Organization
+from app.schemas.complaint import ComplaintIngest
+from app.utils.feed import fan_out_complaints
+from app.utils.search import index_complaints
+from app.utils.state_history import record_complaints_started
+from app.utils.stats import record_complaints_created
+from app.utils.trending import store_hashtags, trending_hashtags
+
+def _validation_errors(error: ValidationError) -> List[str]:
+    return [
+        f"{'.'.join(str(part) for part in detail['loc'])}: {detail['msg']}" if detail["loc"] else detail["msg"]
+        for detail in error.errors()
+    ]
+
+def _column_value(complaint: Complaint, key: str):
+    """Attribute of a transient complaint, or its column's scalar default when unset"""
+    value = getattr(complaint, key)
+    default = Complaint.__table__.c[key].default
+    if value is None and default is not None and default.is_scalar:
+        return default.arg
+    return value
+
+def insert_complaints(db: Session, complaints: List[Complaint]) -> List[int]:
+    """
+    Insert transient complaints with one multi-row INSERT and set their ids
+    
+    MySQL has no RETURNING, so the rows carry a batch token and their ids
+    are read back with one indexed SELECT; the ids one INSERT assigns
+    increase in row order. Does not commit.
+    """
+    token = uuid.uuid4().hex
+    keys = [*ComplaintIngest.model_fields, "created"]
+    db.execute(insert(Complaint).values([
+        dict({key: _column_value(complaint, key) for key in keys}, ingest_batch=token)
+        for complaint in complaints
+    ]))
+    ids = [
+        complaint_id for (complaint_id,) in db.query(Complaint.id).filter(
+            Complaint.ingest_batch == token
+        ).order_by(Complaint.id)
+    ]
+    for complaint, complaint_id in zip(complaints, ids):
+        complaint.id = complaint_id
+    return ids
+
+def ingest_complaint_chunk(
+    db: Session,
+    first_index: int,
+    payloads: List[Any],
+    background_tasks: BackgroundTasks
+) -> List[Dict]:
+    """
+    Validate and insert one chunk of complaint payloads in a single transaction
+    
+    Items may be bare complaints or wrapped as {"complaint": {...}}. Returns
+    one result per item, with its position in the whole request, in order.
+    """
+    results: List[Dict] = []
+    valid = []
+    for index, payload in enumerate(payloads, first_index):
+        if isinstance(payload, dict) and isinstance(payload.get("complaint"), dict):
+            payload = payload["complaint"]
+        try:
+            valid.append((index, ComplaintIngest.model_validate(payload)))
+        except ValidationError as e:
+            results.append({"index": index, "status": "error", "errors": _validation_errors(e)})
+    
+    company_ids = {item.company_id for _, item in valid}
+    known = {
+        org_id for (org_id,) in db.query(Organization.id).filter(Organization.id.in_(company_ids))
+    } if company_ids else set()
+    
+    # UTC from here rather than the database clock, like the state change timestamps
+    created = datetime.utcnow()
+    complaints = []
+    for index, item in valid:
+        if item.company_id not in known:
+            results.append({"index": index, "status": "error", "errors": ["companyId: organization not found"]})
+            continue
+        # Set here like every other insert path instead of left to the column default
+        fields = item.model_dump(exclude_none=True, exclude={"state"})
+        complaints.append((index, Complaint(**fields, state=item.state, created=created)))
+    
+    if complaints:
+        new_complaints = [complaint for _, complaint in complaints]
+        try:
+            # Counters are seeded from the tables, so they are updated before the insert
+            record_complaints_created(new_complaints, db)
+            ids = insert_complaints(db, new_complaints)
+            fan_out_complaints(db, new_complaints, background_tasks)
+            index_complaints(db, new_complaints)
+            record_complaints_started(db, ids)
+            tagged = [(complaint.hashtags, complaint.company_id) for complaint in new_complaints]
+            store_hashtags(db, tagged, created)
+            db.commit()
+        except SQLAlchemyError as e:
+            db.rollback()
+            print(f"Bulk ingestion chunk at {first_index} failed: {e}")
+            results.extend(
+                {"index": index, "status": "error", "errors": ["database error, chunk rolled back"]}
+                for index, _ in complaints
+            )
+        else:
+            for hashtags, company_id in tagged:
+                trending_hashtags.record(hashtags, company_id, created)
+            results.extend(
+                {"index": index, "status": "created", "id": complaint_id}
+                for (index, _), complaint_id in zip(complaints, ids)
+            )
+    
+    results.sort(key=lambda result: result["index"])
+    return results
@@ -0,0 +1,139 @@
+"""
+Leader election for scheduled jobs
+
+Every uvicorn/gunicorn worker runs the scheduler loop, but only the process
+holding a job's lease runs it. The lease is a row in scheduler_leases that
+the leader keeps renewing; when the leader dies the row expires and another
+process takes over. Single-host setups can use an flock()-based file lease
+instead (SCHEDULER_LOCK=file), which the OS releases when the holder exits;
+the lock file also records the last period the job ran for.
+"""
+import fcntl
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from app.config import settings
+from app.database import SessionLocal
+from app.models.scheduler_lease import SchedulerLease
+
+def _holder_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+class DatabaseLease:
+    """Lease stored in the scheduler_leases table"""
+
+    def __init__(self, name: str, ttl: int):
+        self.name = name
+        self.ttl = ttl
+        self.holder = _holder_id()
+        # Without the table every acquire fails and the job never runs anywhere
+        SchedulerLease.__table__.create(bind=SessionLocal.kw["bind"], checkfirst=True)
+
+    def acquire(self) -> bool:
+        """Take the lease if it is free or expired, or renew it if we hold it"""
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            expires_at = now + timedelta(seconds=self.ttl)
+            taken = db.query(SchedulerLease).filter(
+                SchedulerLease.name == self.name,
+                or_(SchedulerLease.holder == self.holder, SchedulerLease.expires_at < now)
+            ).update({"holder": self.holder, "expires_at": expires_at}, synchronize_session=False)
+            if taken:
+                db.commit()
+                return True
+            
+            try:
+                db.add(SchedulerLease(name=self.name, holder=self.holder, expires_at=expires_at))
+                db.commit()
+                return True
+            except IntegrityError:
+                # Someone else holds a live lease
+                db.rollback()
+                return False
+        finally:
+            db.close()
+
+    def release(self):
+        db = SessionLocal()
+        try:
+            db.query(SchedulerLease).filter(
+                SchedulerLease.name == self.name,
+                SchedulerLease.holder == self.holder
+            ).update({"expires_at": datetime.utcnow()}, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def last_run(self) -> Optional[datetime]:
+        db = SessionLocal()
+        try:
+            return db.query(SchedulerLease.last_run_at).filter(SchedulerLease.name == self.name).scalar()
+        finally:
+            db.close()
+
+    def mark_run(self, period_start: datetime):
+        db = SessionLocal()
+        try:
+            db.query(SchedulerLease).filter(
+                SchedulerLease.name == self.name,
+                SchedulerLease.holder == self.holder
+            ).update({"last_run_at": period_start}, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+class FileLease:
+    """Lease held as an exclusive flock() on a local file holding the last run period"""
+
+    def __init__(self, name: str, ttl: int):
+        self.name = name
+        self.ttl = ttl
+        self.path = os.path.join(settings.SCHEDULER_LOCK_DIR, f"wespeak-{name}.lock")
+        self._fd = None
+        # Until a run is recorded, a new leader waits for the next period like the old scheduler did
+        self._started = datetime.utcnow()
+
+    def acquire(self) -> bool:
+        if self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+    def last_run(self) -> Optional[datetime]:
+        if self._fd is None:
+            return self._started
+        recorded = os.pread(self._fd, 64, 0).decode(errors="ignore").strip()
+        try:
+            return datetime.fromisoformat(recorded) if recorded else self._started
+        except ValueError:
+            return self._started
+
+    def mark_run(self, period_start: datetime):
+        if self._fd is None:
+            return
+        os.ftruncate(self._fd, 0)
+        os.pwrite(self._fd, period_start.isoformat().encode(), 0)
+        os.fsync(self._fd)
+
+def create_lease(name: str):
+    """Lease for job `name` using the backend selected by SCHEDULER_LOCK"""
+    if settings.SCHEDULER_LOCK == "file":
+        return FileLease(name, settings.SCHEDULER_LEASE_TTL)
+    return DatabaseLease(name, settings.SCHEDULER_LEASE_TTL)
@@ -23,8 +23,10 @@ def ensure_mongodb_compatibility():
     print("✓ Organization.admins: [userId1, userId2, ...]")
     print("✓ Organization.organization_image: {big, medium, small}")
     print("✓ Organization.markers: [string1, string2, ...]")
-    print("✓ Organization.stats: {complaintsCounter, score, replies, dataGraph, etc.}")
-    print("✓ Complaint JSON fields: hashtags, state_dates, views, shares")
+    print("✓ Organization.stats: {complaintsCounter, score, replies, etc.}")
+    print("✓ Complaint JSON fields: hashtags")
+    print("✓ Complaint state transitions: complaints_history + complaint_timings (python -m app.utils.state_history)")
+    print("✓ Complaint views/shares: complaint_engagements rows + counters (python -m app.utils.engagement)")
 
 def migrate_users_from_mongo_export(mongo_users_json_file: str):
     """
@@ -168,12 +170,6 @@ def create_sample_data():
                         "reimbursed": 0,
                         "gainedVotes": 0,
                         "lostVotes": 0,
-                        "dataGraph": {
-                            "day": [0.0] * 12,
-                            "days": [0.0] * 31,
-                            "month": [0.0] * 12,
-                            "year": [0.0] * 12
-                        },
                         "votes": []
                     }
                 )
@@ -0,0 +1,132 @@
+"""
+Keyset (cursor) pagination helpers
+
+A cursor is an opaque URL-safe token encoding the sort key of the last row
+of a page, so the next page is an index range scan starting right after it
+instead of an OFFSET that scans and discards every earlier row.
+
+Timestamps are compared through `keyset_timestamp`, which is the column
+itself everywhere but SQLite. SQLite stores datetimes as text, and server
+defaults such as CURRENT_TIMESTAMP lack the fraction a bound Python datetime
+always carries, so equal instants would not compare equal there.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+from fastapi import HTTPException, Response, status
+from sqlalchemy import DateTime, and_, or_
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+class keyset_timestamp(FunctionElement):
+    """A datetime column or value in the form keyset cursors compare and order by"""
+    type = DateTime()
+    name = "keyset_timestamp"
+    inherit_cache = True
+
+@compiles(keyset_timestamp)
+def _compile_keyset_timestamp(element, compiler, **kw):
+    return compiler.process(element.clauses, **kw)
+
+@compiles(keyset_timestamp, "sqlite")
+def _compile_keyset_timestamp_sqlite(element, compiler, **kw):
+    return f"strftime('%Y-%m-%d %H:%M:%f', {compiler.process(element.clauses, **kw)})"
+
+def _encode(values: list) -> str:
+    payload = json.dumps(values, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def _decode(cursor: str) -> list:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded.encode()))
+
+def _invalid_cursor() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Invalid cursor"
+    )
+
+def encode_cursor(created: datetime, row_id: int) -> str:
+    return _encode([created.isoformat(), row_id])
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        created, row_id = _decode(cursor)
+        return datetime.fromisoformat(created), int(row_id)
+    except (ValueError, TypeError):
+        raise _invalid_cursor()
+
+def encode_score_cursor(score: int, row_id: int) -> str:
+    """Cursor for listings ranked by an integer score, ties broken by id"""
+    return _encode([score, row_id])
+
+def decode_score_cursor(cursor: str) -> Tuple[int, int]:
+    try:
+        score, row_id = _decode(cursor)
+        return int(score), int(row_id)
+    except (ValueError, TypeError):
+        raise _invalid_cursor()
+
+def newest_first(created_column, id_column) -> Tuple:
+    """ORDER BY clauses of a newest-first keyset listing"""
+    return keyset_timestamp(created_column).desc(), id_column.desc()
+
+def before_cursor(created_column, id_column, cursor: str):
+    """Rows after the one `cursor` encodes in a newest-first listing"""
+    created, row_id = decode_cursor(cursor)
+    return or_(
+        keyset_timestamp(created_column) < keyset_timestamp(created),
+        and_(keyset_timestamp(created_column) == keyset_timestamp(created), id_column < row_id)
+    )
+
+def after_cursor(created_column, id_column, cursor: str):
+    """Rows after the one `cursor` encodes in an oldest-first listing"""
+    created, row_id = decode_cursor(cursor)
+    return or_(
+        keyset_timestamp(created_column) > keyset_timestamp(created),
+        and_(keyset_timestamp(created_column) == keyset_timestamp(created), id_column > row_id)
+    )
+
+def paginate_newest_first(
+    query,
+    created_column,
+    id_column,
+    size: int,
+    page: int = 0,
+    cursor: Optional[str] = None,
+    response: Optional[Response] = None
+) -> List:
+    """
+    Page `query` ordered by (created, id) descending
+    
+    With a cursor the page starts right after the row it encodes; without
+    one the legacy `page` row offset is applied. When the page is full, the
+    cursor of its last row is returned in the X-Next-Cursor header.
+    """
+    query = query.order_by(*newest_first(created_column, id_column))
+    
+    if cursor:
+        query = query.filter(before_cursor(created_column, id_column, cursor))
+    elif page:
+        query = query.offset(page)
+    
+    items = query.limit(size).all()
+    
+    if response is not None and len(items) == size:
+        last = items[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(
+            getattr(last, created_column.key), getattr(last, id_column.key)
+        )
+    return items
+
+def paginate_oldest_first(query, created_column, id_column, size: int, cursor: Optional[str] = None) -> List:
+    """Page `query` ordered by (created, id) ascending, starting right after the row of `cursor`"""
+    query = query.order_by(keyset_timestamp(created_column).asc(), id_column.asc())
+    
+    if cursor:
+        query = query.filter(after_cursor(created_column, id_column, cursor))
+    
+    return query.limit(size).all()
@@ -0,0 +1,101 @@
+"""
+Publish/subscribe broker for real-time chat delivery
+
+Chat messages are published to a channel per chat and per inbox, and every
+WebSocket connection subscribes to the channels it may see. The in-memory
+broker only reaches subscribers of the same process; with several workers
+set CHAT_BROKER=redis so a message sent through one worker reaches the
+connections held by the others (requires the `redis` package).
+"""
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Set
+from app.config import settings
+
+def chat_channel(chat_id: int) -> str:
+    return f"chat:{chat_id}"
+
+def user_inbox_channel(user_id: int) -> str:
+    return f"inbox:user:{user_id}"
+
+def company_inbox_channel(company_id: int) -> str:
+    return f"inbox:company:{company_id}"
+
+async def _iter_queue(queue: asyncio.Queue) -> AsyncIterator[Dict]:
+    while True:
+        yield await queue.get()
+
+class InMemoryBroker:
+    """Broker delivering to the subscribers of this process through bounded queues"""
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+
+    async def publish(self, channel: str, message: Dict):
+        for queue in list(self._subscribers.get(channel, ())):
+            if queue.full():
+                # A subscriber that can't keep up loses its oldest message, not the newest
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+    @asynccontextmanager
+    async def subscribe(self, channels: List[str]) -> AsyncIterator[AsyncIterator[Dict]]:
+        """Messages published to any of `channels` while the context is open"""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        for channel in channels:
+            self._subscribers.setdefault(channel, set()).add(queue)
+        try:
+            yield _iter_queue(queue)
+        finally:
+            for channel in channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(queue)
+                    if not subscribers:
+                        del self._subscribers[channel]
+
+    async def close(self):
+        pass
+
+class RedisBroker:
+    """Broker going through Redis pub/sub, shared by every worker"""
+
+    def __init__(self, url: str):
+        try:
+            from redis import asyncio as redis
+        except ImportError:
+            raise RuntimeError("CHAT_BROKER=redis requires the redis package")
+        self._client = redis.from_url(url)
+
+    async def publish(self, channel: str, message: Dict):
+        await self._client.publish(channel, json.dumps(message))
+
+    @asynccontextmanager
+    async def subscribe(self, channels: List[str]) -> AsyncIterator[AsyncIterator[Dict]]:
+        """Messages published to any of `channels` while the context is open"""
+        pubsub = self._client.pubsub()
+        await pubsub.subscribe(*channels)
+        
+        async def messages():
+            async for item in pubsub.listen():
+                if item["type"] == "message":
+                    yield json.loads(item["data"])
+        
+        try:
+            yield messages()
+        finally:
+            await pubsub.unsubscribe()
+            await pubsub.aclose()
+
+    async def close(self):
+        await self._client.aclose()
+
+def create_broker():
+    """Broker selected by CHAT_BROKER"""
+    if settings.CHAT_BROKER == "redis":
+        return RedisBroker(settings.CHAT_BROKER_URL)
+    return InMemoryBroker(settings.CHAT_SUBSCRIBER_QUEUE_SIZE)
+
+chat_broker = create_broker()
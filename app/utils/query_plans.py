@@ -0,0 +1,94 @@
+"""
+EXPLAIN check for the hot queries
+
+Each hot query is listed with the index it is expected to use. The check
+runs EXPLAIN (EXPLAIN QUERY PLAN on SQLite) and reports the queries whose
+plan no longer mentions their index. Run it in CI or after a migration
+against a database with realistic data, since optimizers skip indexes on
+near-empty tables:
+
+    python -m app.utils.query_plans
+
+It exits with status 1 when a query lost its index. tests/test_query_plans.py
+runs the same check against a freshly migrated database.
+"""
+import sys
+from typing import Callable, List, Tuple
+from sqlalchemy import text
+from sqlalchemy.orm import Query, Session
+from app.models.chat import Chat, ChatCompany, ChatMessage
+from app.models.complaint import Complaint
+from app.models.feed import FeedEntry
+from app.models.image import Image
+from app.models.reply import Reply
+from app.models.user import User
+
+HOT_QUERIES: List[Tuple[str, str, Callable[[Session], Query]]] = [
+    ("organization complaints", "ix_complaints_company_created", lambda db: db.query(Complaint).filter(
+        Complaint.company_id == 1
+    ).order_by(Complaint.created.desc(), Complaint.id.desc()).limit(20)),
+    ("all complaints", "ix_complaints_created", lambda db: db.query(Complaint).order_by(
+        Complaint.created.desc(), Complaint.id.desc()
+    ).limit(20)),
+    ("user complaints", "ix_complaints_user_created", lambda db: db.query(Complaint).filter(
+        Complaint.user_id == 1
+    ).order_by(Complaint.created.desc())),
+    ("complaints by state", "ix_complaints_state", lambda db: db.query(Complaint.id).filter(
+        Complaint.state == "resolved"
+    )),
+    ("user feed", "ix_feed_entries_user_created", lambda db: db.query(FeedEntry).filter(
+        FeedEntry.user_id == 1
+    ).order_by(FeedEntry.created.desc(), FeedEntry.complaint_id.desc()).limit(20)),
+    ("complaint chat", "ix_chats_complaint_id", lambda db: db.query(Chat).filter(Chat.complaint_id == 1)),
+    ("user chats", "ix_chats_user_last_message", lambda db: db.query(Chat).filter(
+        Chat.user_id == 1
+    ).order_by(Chat.last_message_date.desc())),
+    ("chat messages", "ix_chat_messages_chat_sent", lambda db: db.query(ChatMessage).filter(
+        ChatMessage.chat_id == 1
+    ).order_by(ChatMessage.sent_date)),
+    ("chat companies of a chat", "ix_chat_companies_chat_id", lambda db: db.query(ChatCompany).filter(
+        ChatCompany.chat_id == 1
+    )),
+    ("chat companies of an organization", "ix_chat_companies_company_id", lambda db: db.query(ChatCompany).filter(
+        ChatCompany.company_id == 1
+    )),
+    ("organization inbox", "ix_chat_companies_company_last_message", lambda db: db.query(ChatCompany).filter(
+        ChatCompany.company_id == 1
+    ).order_by(ChatCompany.last_message_date.desc(), ChatCompany.chat_id.desc()).limit(20)),
+    ("complaint replies", "ix_replies_complaint_id", lambda db: db.query(Reply).filter(Reply.complaint_id == 1)),
+    ("complaint images", "ix_images_complaint_id", lambda db: db.query(Image).filter(Image.complaint_id == 1)),
+    ("email verification", "ix_users_verification_token", lambda db: db.query(User).filter(
+        User.verification_token == "token"
+    )),
+]
+
+def explain(db: Session, query: Query) -> str:
+    """The database's plan for `query`, flattened to one string"""
+    bind = db.get_bind()
+    sql = str(query.statement.compile(bind, compile_kwargs={"literal_binds": True}))
+    prefix = "EXPLAIN QUERY PLAN" if bind.dialect.name == "sqlite" else "EXPLAIN"
+    rows = db.execute(text(f"{prefix} {sql}")).all()
+    return "\n".join(" ".join(str(value) for value in row) for row in rows)
+
+def check_query_plans(db: Session) -> List[Tuple[str, str, str]]:
+    """(name, expected index, plan) of every hot query whose plan does not use its index"""
+    failures = []
+    for name, index, build_query in HOT_QUERIES:
+        plan = explain(db, build_query(db))
+        if index not in plan:
+            failures.append((name, index, plan))
+    return failures
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+    
+    session = SessionLocal()
+    try:
+        failures = check_query_plans(session)
+    finally:
+        session.close()
+    
+    for name, index, plan in failures:
+        print(f"{name}: expected {index}, plan was:\n{plan}\n")
+    print(f"{len(HOT_QUERIES) - len(failures)}/{len(HOT_QUERIES)} hot queries use their index")
+    sys.exit(1 if failures else 0)
@@ -1,28 +1,184 @@
 import asyncio
-from datetime import datetime
-from sqlalchemy.orm import Session
+import random
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import List
+from app.config import settings
 from app.database import SessionLocal
-from app.utils.stats import update_organization_stats
+from app.utils.company_stats import company_stats_cache
 from app.models.organization import Organization
+from app.utils.leader import create_lease
+from app.utils.score_history import prune_score_samples
+from app.utils.stats import classify_crisis_organizations, invalidate_crisis_feed, recompute_organization_stats
+from app.utils.trending import prune_hashtag_rollups
 
-async def run_hourly_stats_update():
-    """Run hourly statistics update for all organizations"""
+def _load_organization_ids() -> List[int]:
+    db = SessionLocal()
+    try:
+        return [org_id for (org_id,) in db.query(Organization.id).order_by(Organization.id)]
+    finally:
+        db.close()
+
+def _recompute_batch(organization_ids: List[int]) -> int:
+    """Recompute one batch of organizations with a session owned by the worker"""
     db = SessionLocal()
     try:
-        organizations = db.query(Organization).all()
-        for org in organizations:
-            update_organization_stats(org.id, db)
-        print(f"Updated stats for {len(organizations)} organizations at {datetime.utcnow()}")
+        return recompute_organization_stats(db, organization_ids)
     finally:
         db.close()
 
+def _prune_score_history() -> int:
+    """Drop raw score samples past the retention window; rollups are kept"""
+    db = SessionLocal()
+    try:
+        cutoff = datetime.utcnow() - timedelta(days=settings.SCORE_SAMPLE_RETENTION_DAYS)
+        deleted = prune_score_samples(db, cutoff)
+        db.commit()
+        return deleted
+    finally:
+        db.close()
+
+def _prune_hashtag_rollups() -> int:
+    """Drop trending rollup rows past the longest window"""
+    db = SessionLocal()
+    try:
+        deleted = prune_hashtag_rollups(db)
+        db.commit()
+        return deleted
+    finally:
+        db.close()
+
+def _classify_crisis() -> dict:
+    db = SessionLocal()
+    try:
+        return classify_crisis_organizations(db)
+    finally:
+        db.close()
+
+def _dispose_inherited_connections():
+    """
+    Process pool initializer: forget the pooled connections inherited from
+    the parent, which keeps using them, so the worker opens its own
+    """
+    SessionLocal.kw["bind"].dispose(close=False)
+
+def _create_executor() -> Executor:
+    if settings.STATS_EXECUTOR == "process":
+        return ProcessPoolExecutor(max_workers=settings.STATS_WORKERS, initializer=_dispose_inherited_connections)
+    return ThreadPoolExecutor(max_workers=settings.STATS_WORKERS, thread_name_prefix="stats")
+
+async def run_hourly_stats_update():
+    """
+    Run hourly statistics update for all organizations
+    
+    Stats are kept current by incremental counters on every complaint and
+    chat event; this pass reconciles those counters and samples every score
+    into the score history.
+    The synchronous database work runs in batches on a worker pool so the
+    event loop keeps serving requests while the job is running.
+    """
+    started = time.monotonic()
+    loop = asyncio.get_running_loop()
+    executor = _create_executor()
+    try:
+        organization_ids = await loop.run_in_executor(executor, _load_organization_ids)
+        batch_size = settings.STATS_BATCH_SIZE
+        batches = [
+            organization_ids[start:start + batch_size]
+            for start in range(0, len(organization_ids), batch_size)
+        ]
+        
+        futures = [loop.run_in_executor(executor, _recompute_batch, batch) for batch in batches]
+        updated = 0
+        failed = 0
+        for done, future in enumerate(asyncio.as_completed(futures), 1):
+            try:
+                updated += await future
+            except Exception as e:
+                failed += 1
+                print(f"Stats batch failed: {e}")
+            print(f"Stats update progress: {done}/{len(batches)} batches, {updated} organizations")
+        # Summaries are rebuilt from the fresh stats and score samples
+        company_stats_cache.clear()
+        
+        pruned = await loop.run_in_executor(executor, _prune_score_history)
+        print(f"Pruned {pruned} score samples")
+        
+        pruned = await loop.run_in_executor(executor, _prune_hashtag_rollups)
+        print(f"Pruned {pruned} hashtag rollups")
+        
+        crisis = await loop.run_in_executor(executor, _classify_crisis)
+        # In process mode the worker invalidated its own copy of the cache
+        if crisis["entered"] or crisis["left"]:
+            invalidate_crisis_feed()
+        print(
+            f"Crisis classification: {len(crisis['entered'])} entered, {len(crisis['left'])} left "
+            f"(threshold {crisis['threshold']:.1f}) in {crisis['duration']:.2f}s"
+        )
+    finally:
+        executor.shutdown(wait=False)
+    
+    duration = time.monotonic() - started
+    print(
+        f"Updated stats for {updated} organizations in {duration:.1f}s "
+        f"({failed} failed batches) at {datetime.utcnow()}"
+    )
+    return {"updated": updated, "failed_batches": failed, "crisis": crisis, "duration": duration}
+
+async def _renew_lease(lease):
+    """Keep renewing the lease while a long job is running"""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(lease.ttl / 3)
+        if not await loop.run_in_executor(None, lease.acquire):
+            print("Lost the scheduler lease while the stats update was running")
+
 async def start_scheduler():
-    """Start the background scheduler"""
+    """
+    Start the background scheduler
+    
+    Every worker process runs this loop; only the holder of the scheduler
+    lease runs the stats update, once per SCHEDULER_INTERVAL. Each period's
+    run is delayed by a random jitter so jobs don't all fire on the boundary,
+    and a follower that takes over a dead leader's lease runs a missed period.
+    On a deployment with no recorded run, the first run is the next period's.
+    """
+    lease = create_lease("hourly-stats")
+    loop = asyncio.get_running_loop()
+    interval = settings.SCHEDULER_INTERVAL
+    period_start = None
+    jitter = 0.0
+    
     while True:
-        await asyncio.sleep(3600)  # Run every hour
-        await run_hourly_stats_update()
+        now = time.time()
+        current_period = now - now % interval
+        if current_period != period_start:
+            period_start = current_period
+            jitter = random.uniform(0, settings.SCHEDULER_JITTER)
+        
+        try:
+            is_leader = await loop.run_in_executor(None, lease.acquire)
+            if is_leader and now >= period_start + jitter:
+                period = datetime.utcfromtimestamp(period_start)
+                last_run = await loop.run_in_executor(None, lease.last_run)
+                if last_run is None:
+                    # Nothing has run yet: count this period as done so the
+                    # first run waits for the next one instead of startup
+                    await loop.run_in_executor(None, lease.mark_run, period)
+                elif last_run < period:
+                    renewal = asyncio.create_task(_renew_lease(lease))
+                    try:
+                        await run_hourly_stats_update()
+                    finally:
+                        renewal.cancel()
+                    await loop.run_in_executor(None, lease.mark_run, period)
+        except Exception as e:
+            print(f"Hourly stats update failed: {e}")
+        
+        await asyncio.sleep(lease.ttl / 3)
 
 # You can start this in your main.py with:
 # import asyncio
 # from app.utils.scheduler import start_scheduler
-# asyncio.create_task(start_scheduler())
\ No newline at end of file
+# asyncio.create_task(start_scheduler())
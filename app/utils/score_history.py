@@ -0,0 +1,178 @@
+"""
+Organization score history backed by the score_samples and score_rollups tables
+"""
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlalchemy import and_, insert, or_
+from sqlalchemy.orm import Session
+from app.models.score_history import ScoreSample, ScoreRollup
+from app.utils.sql import upsert_increment
+
+RESOLUTIONS = ["2h", "day", "month", "year"]
+
+def bucket_start(resolution: str, moment: datetime) -> datetime:
+    """Start of the rollup bucket of `resolution` containing `moment`"""
+    moment = moment.replace(minute=0, second=0, microsecond=0)
+    if resolution == "2h":
+        return moment.replace(hour=moment.hour // 2 * 2)
+    moment = moment.replace(hour=0)
+    if resolution == "day":
+        return moment
+    moment = moment.replace(day=1)
+    if resolution == "month":
+        return moment
+    if resolution == "year":
+        return moment.replace(month=1)
+    raise ValueError(f"Unknown resolution: {resolution}")
+
+def record_score_samples(db: Session, scores: Dict[int, float], sampled_at: Optional[datetime] = None):
+    """
+    Append one score sample per organization and fold it into every rollup
+    
+    Issues one multi-row insert for the samples and one upsert for the
+    rollups. Does not commit.
+    """
+    if not scores:
+        return
+    sampled_at = sampled_at or datetime.utcnow()
+    
+    db.execute(insert(ScoreSample), [
+        {"organization_id": org_id, "sampled_at": sampled_at, "score": score}
+        for org_id, score in scores.items()
+    ])
+    
+    rollups = [
+        {
+            "organization_id": org_id,
+            "resolution": resolution,
+            "bucket_start": bucket_start(resolution, sampled_at),
+            "score_sum": score,
+            "samples": 1
+        }
+        for org_id, score in scores.items()
+        for resolution in RESOLUTIONS
+    ]
+    upsert_increment(
+        db, ScoreRollup, rollups,
+        key_columns=["organization_id", "resolution", "bucket_start"],
+        increment_columns=["score_sum", "samples"]
+    )
+
+def import_legacy_data_graphs(db: Session, graphs: Dict[int, Dict], today: Optional[datetime] = None):
+    """
+    Fold legacy stats.dataGraph arrays into the rollups before they are dropped
+    
+    The arrays are positional within the current day, month and year, so
+    only slots up to `today` are imported; empty (zero) slots are skipped.
+    Does not commit.
+    """
+    today = today or datetime.utcnow()
+    rows = []
+    
+    def add(organization_id, resolution, start_date, value):
+        if value:
+            rows.append({
+                "organization_id": organization_id,
+                "resolution": resolution,
+                "bucket_start": start_date,
+                "score_sum": float(value),
+                "samples": 1
+            })
+    
+    for org_id, graph in graphs.items():
+        graph = graph or {}
+        for slot, value in enumerate((graph.get("day") or [])[:today.hour // 2 + 1]):
+            add(org_id, "2h", bucket_start("day", today).replace(hour=slot * 2), value)
+        for slot, value in enumerate((graph.get("days") or [])[:today.day]):
+            add(org_id, "day", bucket_start("month", today).replace(day=slot + 1), value)
+        for slot, value in enumerate((graph.get("month") or [])[:today.month]):
+            add(org_id, "month", bucket_start("year", today).replace(month=slot + 1), value)
+        year_values = graph.get("year") or []
+        for year in range(max(2018, today.year - 11), today.year + 1):
+            slot = (year - 2018) % 12
+            if slot < len(year_values):
+                add(org_id, "year", bucket_start("year", today).replace(year=year), year_values[slot])
+    
+    upsert_increment(
+        db, ScoreRollup, rows,
+        key_columns=["organization_id", "resolution", "bucket_start"],
+        increment_columns=["score_sum", "samples"]
+    )
+
+def prune_score_samples(db: Session, older_than: datetime) -> int:
+    """Delete raw samples older than `older_than`; rollups are kept. Does not commit."""
+    return db.query(ScoreSample).filter(ScoreSample.sampled_at < older_than).delete(synchronize_session=False)
+
+def get_score_history(
+    db: Session,
+    organization_id: int,
+    resolution: str = "day",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+) -> List[Dict]:
+    """Score history of one organization in [start, end) at `resolution` ("raw" or a rollup)"""
+    if resolution == "raw":
+        query = db.query(ScoreSample.sampled_at, ScoreSample.score).filter(
+            ScoreSample.organization_id == organization_id
+        )
+        if start:
+            query = query.filter(ScoreSample.sampled_at >= start)
+        if end:
+            query = query.filter(ScoreSample.sampled_at < end)
+        return [
+            {"date": sampled_at, "score": score, "samples": 1}
+            for sampled_at, score in query.order_by(ScoreSample.sampled_at)
+        ]
+    
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution: {resolution}")
+    
+    query = db.query(ScoreRollup.bucket_start, ScoreRollup.score_sum, ScoreRollup.samples).filter(
+        ScoreRollup.organization_id == organization_id,
+        ScoreRollup.resolution == resolution
+    )
+    if start:
+        query = query.filter(ScoreRollup.bucket_start >= bucket_start(resolution, start))
+    if end:
+        query = query.filter(ScoreRollup.bucket_start < end)
+    return [
+        {"date": start_date, "score": round(score_sum / samples, 2), "samples": samples}
+        for start_date, score_sum, samples in query.order_by(ScoreRollup.bucket_start)
+    ]
+
+def build_data_graph(db: Session, organization_id: int, today: Optional[datetime] = None) -> Dict[str, List[float]]:
+    """
+    Legacy stats.dataGraph arrays rebuilt from the rollups
+    
+    day holds today's 2-hour buckets, days this month's days, month this
+    year's months and year the last 12 years at slot (year - 2018) % 12.
+    """
+    today = today or datetime.utcnow()
+    graph = {"day": [0.0] * 12, "days": [0.0] * 31, "month": [0.0] * 12, "year": [0.0] * 12}
+    
+    oldest_year = bucket_start("year", today).replace(year=today.year - 11)
+    windows = [
+        ("2h", bucket_start("day", today)),
+        ("day", bucket_start("month", today)),
+        ("month", bucket_start("year", today)),
+        ("year", oldest_year)
+    ]
+    rows = db.query(ScoreRollup.resolution, ScoreRollup.bucket_start, ScoreRollup.score_sum, ScoreRollup.samples).filter(
+        ScoreRollup.organization_id == organization_id,
+        or_(*[
+            and_(ScoreRollup.resolution == resolution, ScoreRollup.bucket_start >= since)
+            for resolution, since in windows
+        ])
+    )
+    
+    for resolution, start_date, score_sum, samples in rows:
+        score = round(score_sum / samples, 2) if samples else 0.0
+        if resolution == "2h":
+            graph["day"][start_date.hour // 2] = score
+        elif resolution == "day":
+            graph["days"][start_date.day - 1] = score
+        elif resolution == "month":
+            graph["month"][start_date.month - 1] = score
+        else:
+            graph["year"][(start_date.year - 2018) % 12] = score
+    return graph
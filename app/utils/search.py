@@ -0,0 +1,191 @@
+"""
+Complaint full-text search over an embedded inverted index
+
+Every complaint's subject, topic, hashtags, message and description are
+tokenized into complaint_terms postings with a field-weighted term count,
+and search_terms keeps how many complaints contain each term. A search
+sums weight * idf over the postings of the query terms, so it only reads
+the index rows of those terms. The postings of a complaint are rewritten
+whenever it is created or its text is edited.
+"""
+import math
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import and_, case, func, insert, or_
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models.complaint import Complaint
+from app.models.search import ComplaintTerm, SearchTerm
+from app.utils.cache import TTLCache
+from app.utils.pagination import decode_score_cursor, encode_score_cursor
+from app.utils.sql import upsert_increment
+
+# Matches in short, curated fields count for more than matches in free text
+FIELD_WEIGHTS = {
+    "subject": 3,
+    "topic": 3,
+    "hashtags": 3,
+    "message": 1,
+    "description": 1,
+}
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "for", "from", "has", "have", "i", "in", "is",
+    "it", "my", "not", "of", "on", "or", "so", "that", "the", "this", "to", "was", "we", "were", "with",
+    "al", "con", "de", "del", "el", "en", "es", "la", "las", "lo", "los", "mi", "no", "para", "por",
+    "que", "se", "su", "un", "una", "y",
+}
+
+MAX_TERM_LENGTH = 64
+
+_TOKEN = re.compile(r"[^\W_]+")
+
+_document_count_cache = TTLCache(settings.SEARCH_DOCUMENT_COUNT_TTL, max_entries=1)
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lowercased, accent-folded words of `text` without stopwords"""
+    if not text:
+        return []
+    folded = unicodedata.normalize("NFKD", text.lower())
+    folded = "".join(char for char in folded if not unicodedata.combining(char))
+    return [
+        token for token in _TOKEN.findall(folded)
+        if token not in STOPWORDS and len(token) <= MAX_TERM_LENGTH
+    ]
+
+def complaint_terms(complaint: Complaint) -> Dict[str, int]:
+    """Field-weighted term counts of a complaint"""
+    weights = Counter()
+    for field, weight in FIELD_WEIGHTS.items():
+        value = getattr(complaint, field)
+        if field == "hashtags":
+            value = " ".join(str(tag) for tag in (value or []))
+        for token in tokenize(value):
+            weights[token] += weight
+    return weights
+
+def index_complaints(db: Session, complaints: Iterable[Complaint]):
+    """
+    Rewrite the postings of flushed complaints from their current text
+    
+    Only the terms that appear or disappear touch search_terms. Does not commit.
+    """
+    complaints = list(complaints)
+    if not complaints:
+        return
+    complaint_ids = [complaint.id for complaint in complaints]
+    
+    previous: Dict[int, set] = {complaint_id: set() for complaint_id in complaint_ids}
+    for complaint_id, term in db.query(ComplaintTerm.complaint_id, ComplaintTerm.term).filter(
+        ComplaintTerm.complaint_id.in_(complaint_ids)
+    ):
+        previous[complaint_id].add(term)
+    db.query(ComplaintTerm).filter(ComplaintTerm.complaint_id.in_(complaint_ids)).delete(synchronize_session=False)
+    
+    postings = []
+    added, removed = Counter(), Counter()
+    for complaint in complaints:
+        terms = complaint_terms(complaint)
+        postings.extend(
+            {"term": term, "complaint_id": complaint.id, "company_id": complaint.company_id, "weight": weight}
+            for term, weight in terms.items()
+        )
+        added.update(terms.keys() - previous[complaint.id])
+        removed.update(previous[complaint.id] - terms.keys())
+    
+    if postings:
+        db.execute(insert(ComplaintTerm), postings)
+    upsert_increment(
+        db, SearchTerm, [{"term": term, "documents": count} for term, count in added.items()],
+        ["term"], ["documents"]
+    )
+    for count in set(removed.values()):
+        terms = [term for term, term_count in removed.items() if term_count == count]
+        db.query(SearchTerm).filter(SearchTerm.term.in_(terms)).update(
+            {SearchTerm.documents: SearchTerm.documents - count}, synchronize_session=False
+        )
+
+def index_complaint(db: Session, complaint: Complaint):
+    index_complaints(db, [complaint])
+
+def _document_count(db: Session) -> int:
+    return _document_count_cache.get("documents", lambda: db.query(func.count(Complaint.id)).scalar())
+
+def search_complaints(
+    db: Session,
+    text: str,
+    size: int,
+    company_id: Optional[int] = None,
+    state: Optional[str] = None,
+    cursor: Optional[str] = None
+) -> Tuple[List[Complaint], Optional[str]]:
+    """
+    One page of complaints matching `text`, most relevant first, and the
+    cursor of the next page
+    
+    A complaint matches when it contains any query term; its score is the
+    sum of its posting weights times the terms' idf, scaled to integers so
+    pages split cleanly on (score, id).
+    """
+    terms = list(dict.fromkeys(tokenize(text)))
+    if not terms:
+        return [], None
+    
+    total = max(_document_count(db), 1)
+    idf = {
+        term: int(1000 * math.log(1 + total / documents))
+        for term, documents in db.query(SearchTerm.term, SearchTerm.documents).filter(
+            SearchTerm.term.in_(terms), SearchTerm.documents > 0
+        )
+    }
+    if not idf:
+        return [], None
+    
+    score = func.sum(ComplaintTerm.weight * case(idf, value=ComplaintTerm.term, else_=0))
+    query = db.query(ComplaintTerm.complaint_id, score.label("score")).filter(ComplaintTerm.term.in_(idf))
+    if company_id is not None:
+        query = query.filter(ComplaintTerm.company_id == company_id)
+    if state:
+        query = query.join(Complaint, Complaint.id == ComplaintTerm.complaint_id).filter(Complaint.state == state)
+    query = query.group_by(ComplaintTerm.complaint_id)
+    if cursor:
+        last_score, last_id = decode_score_cursor(cursor)
+        query = query.having(or_(score < last_score, and_(score == last_score, ComplaintTerm.complaint_id < last_id)))
+    ranked = query.order_by(score.desc(), ComplaintTerm.complaint_id.desc()).limit(size).all()
+    
+    complaints = {
+        complaint.id: complaint
+        for complaint in db.query(Complaint).filter(Complaint.id.in_([complaint_id for complaint_id, _ in ranked]))
+    }
+    ordered = [complaints[complaint_id] for complaint_id, _ in ranked if complaint_id in complaints]
+    
+    next_cursor = encode_score_cursor(int(ranked[-1][1]), ranked[-1][0]) if len(ranked) == size else None
+    return ordered, next_cursor
+
+def rebuild_search_index(db: Session, chunk_size: int = 1000) -> int:
+    """Index every complaint from scratch; returns the number indexed"""
+    db.query(ComplaintTerm).delete(synchronize_session=False)
+    db.query(SearchTerm).delete(synchronize_session=False)
+    db.commit()
+    
+    indexed = 0
+    last_id = 0
+    while True:
+        complaints = db.query(Complaint).filter(Complaint.id > last_id).order_by(Complaint.id).limit(chunk_size).all()
+        if not complaints:
+            return indexed
+        index_complaints(db, complaints)
+        last_id = complaints[-1].id
+        db.commit()
+        indexed += len(complaints)
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+    
+    session = SessionLocal()
+    try:
+        print(f"Indexed {rebuild_search_index(session)} complaints")
+    finally:
+        session.close()
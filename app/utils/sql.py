@@ -0,0 +1,56 @@
+"""
+Dialect-aware SQL helpers for statements SQLAlchemy core does not abstract
+"""
+from typing import Dict, Iterable, List
+from sqlalchemy.orm import Session
+
+def _dialect_insert(db: Session, table):
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return dialect, insert(table)
+
+def insert_ignore(db: Session, model, rows: List[Dict]) -> int:
+    """Multi-row INSERT that skips rows whose key already exists; returns rows inserted"""
+    if not rows:
+        return 0
+    
+    dialect, stmt = _dialect_insert(db, model.__table__)
+    stmt = stmt.values(rows)
+    if dialect == "mysql":
+        stmt = stmt.prefix_with("IGNORE")
+    else:
+        stmt = stmt.on_conflict_do_nothing()
+    return db.execute(stmt).rowcount
+
+def upsert_increment(
+    db: Session,
+    model,
+    rows: List[Dict],
+    key_columns: Iterable[str],
+    increment_columns: Iterable[str]
+):
+    """
+    Multi-row INSERT that adds the incoming values to `increment_columns`
+    when a row with the same `key_columns` already exists
+    """
+    if not rows:
+        return
+    
+    table = model.__table__
+    dialect, stmt = _dialect_insert(db, table)
+    stmt = stmt.values(rows)
+    if dialect == "mysql":
+        stmt = stmt.on_duplicate_key_update({
+            column: table.c[column] + stmt.inserted[column] for column in increment_columns
+        })
+    else:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(key_columns),
+            set_={column: table.c[column] + stmt.excluded[column] for column in increment_columns}
+        )
+    db.execute(stmt)
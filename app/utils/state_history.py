@@ -0,0 +1,196 @@
+"""
+Complaint state transitions and response-time summaries
+
+Every state change appends a complaints_history row in the caller's
+transaction, and complaint_timings keeps when each complaint first
+reached every stage. Stage timestamps are only ever set once, with
+COALESCE in a single UPDATE, so nothing is read back and rewritten.
+"""
+import math
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+from dateutil import parser as date_parser
+from sqlalchemy import func, insert, null, select, update
+from sqlalchemy.orm import Session
+from app.models.complaint import Complaint
+from app.models.complaints_history import ComplaintTiming, ComplaintsHistory
+from app.utils.sql import insert_ignore
+
+# stage: (states that reach it, timestamp column, seconds column)
+STAGES = {
+    "open": (
+        ["opened", "responded", "unresolved", "resolved", "reimbursed"],
+        ComplaintTiming.opened_at, ComplaintTiming.seconds_to_open
+    ),
+    "respond": (
+        ["responded", "resolved", "reimbursed"],
+        ComplaintTiming.responded_at, ComplaintTiming.seconds_to_respond
+    ),
+    "resolve": (
+        ["resolved", "reimbursed"],
+        ComplaintTiming.resolved_at, ComplaintTiming.seconds_to_resolve
+    ),
+}
+
+def _state_value(state) -> Optional[str]:
+    return getattr(state, "value", state)
+
+def record_complaints_started(db: Session, complaint_ids: List[int]):
+    """
+    Write the creation history row and an empty timing summary of flushed
+    complaints, straight from the complaints table. Does not commit.
+    """
+    if not complaint_ids:
+        return
+    created = select(
+        Complaint.id, null(), Complaint.state, Complaint.created
+    ).where(Complaint.id.in_(complaint_ids))
+    db.execute(insert(ComplaintsHistory).from_select(["complaint_id", "from_state", "to_state", "date"], created))
+    
+    timings = select(Complaint.id, Complaint.company_id, Complaint.created).where(Complaint.id.in_(complaint_ids))
+    db.execute(insert(ComplaintTiming).from_select(["complaint_id", "company_id", "created"], timings))
+
+def record_state_change(
+    db: Session,
+    complaint: Complaint,
+    previous_state,
+    changed_by: Optional[int] = None,
+    at: Optional[datetime] = None
+):
+    """
+    Append the transition from `previous_state` to the complaint's current
+    state and stamp the stages it reaches for the first time. Does not commit.
+    """
+    previous_state, state = _state_value(previous_state), _state_value(complaint.state)
+    if previous_state == state:
+        return
+    at = at or datetime.utcnow()
+    
+    db.add(ComplaintsHistory(
+        complaint_id=complaint.id,
+        from_state=previous_state,
+        to_state=state,
+        changed_by=changed_by,
+        date=at
+    ))
+    
+    seconds = max(0, int((at - complaint.created).total_seconds())) if complaint.created else None
+    values = {}
+    for states, reached_at, seconds_to in STAGES.values():
+        if state in states:
+            values[reached_at] = func.coalesce(reached_at, at)
+            values[seconds_to] = func.coalesce(seconds_to, seconds)
+    if not values:
+        return
+    
+    updated = db.execute(
+        update(ComplaintTiming).where(ComplaintTiming.complaint_id == complaint.id).values(values),
+        execution_options={"synchronize_session": False}
+    ).rowcount
+    if not updated:
+        # Complaint from before the timings existed
+        db.add(ComplaintTiming(
+            complaint_id=complaint.id,
+            company_id=complaint.company_id,
+            created=complaint.created,
+            **{column.key: at if column.key.endswith("_at") else seconds for column in values}
+        ))
+
+def _percentile_at(values: List[int], percentile: float) -> int:
+    """Nearest-rank percentile of sorted `values`"""
+    rank = min(len(values), max(1, math.ceil(percentile / 100 * len(values))))
+    return values[rank - 1]
+
+def response_time_percentiles(db: Session, organization_id: int, percentiles: Iterable[float]) -> Dict[str, Dict]:
+    """Seconds to open, respond and resolve at each percentile, with the number of complaints measured"""
+    percentiles = list(percentiles)
+    result = {}
+    for stage, (_, _, column) in STAGES.items():
+        # One ordered range scan of the (company_id, column) index per stage
+        values = [value for (value,) in db.query(column).filter(
+            ComplaintTiming.company_id == organization_id, column.isnot(None)
+        ).order_by(column)]
+        result[stage] = {
+            "count": len(values),
+            "percentiles": {
+                f"p{percentile:g}": _percentile_at(values, percentile) if values else None
+                for percentile in percentiles
+            }
+        }
+    return result
+
+def _parse_date(value) -> Optional[datetime]:
+    """Naive UTC datetime from an ISO string or epoch seconds/milliseconds"""
+    try:
+        if isinstance(value, (int, float)):
+            parsed = datetime.fromtimestamp(value / 1000 if value > 1e11 else value, timezone.utc)
+        else:
+            parsed = date_parser.isoparse(str(value))
+    except (ValueError, OverflowError, OSError):
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def _legacy_state_dates(state_dates) -> List[Tuple[str, datetime]]:
+    """
+    (state, date) pairs of a legacy state_dates value: a list of
+    {"state", "date"} objects or [state, date] pairs, or a state -> date object
+    """
+    if isinstance(state_dates, dict):
+        entries = state_dates.items()
+    elif isinstance(state_dates, list):
+        entries = [
+            (entry.get("state") or entry.get("to_state"), entry.get("date") or entry.get("at"))
+            if isinstance(entry, dict) else tuple(entry[:2])
+            for entry in state_dates
+            if isinstance(entry, dict) or (isinstance(entry, (list, tuple)) and len(entry) >= 2)
+        ]
+    else:
+        return []
+    pairs = []
+    for state, value in entries:
+        date = _parse_date(value) if value is not None else None
+        if state and date:
+            pairs.append((state, date))
+    return pairs
+
+def _backfilled_timing(complaint_id: int, company_id: int, created: Optional[datetime], state_dates) -> Dict:
+    """Timing summary row with every stage the legacy state_dates show as reached"""
+    row = {"complaint_id": complaint_id, "company_id": company_id, "created": created}
+    pairs = _legacy_state_dates(state_dates)
+    for states, reached_at, seconds_to in STAGES.values():
+        dates = [date for state, date in pairs if state in states]
+        at = min(dates) if dates else None
+        row[reached_at.key] = at
+        row[seconds_to.key] = max(0, int((at - created).total_seconds())) if at and created else None
+    return row
+
+def backfill_timings(db: Session, chunk_size: int = 5000) -> int:
+    """
+    Create the missing timing summaries of complaints older than the table,
+    with the stages read from their legacy state_dates; returns rows added
+    """
+    added = 0
+    while True:
+        missing = db.query(
+            Complaint.id, Complaint.company_id, Complaint.created, Complaint.state_dates
+        ).outerjoin(
+            ComplaintTiming, ComplaintTiming.complaint_id == Complaint.id
+        ).filter(ComplaintTiming.complaint_id.is_(None)).limit(chunk_size).all()
+        if not missing:
+            return added
+        rows = [_backfilled_timing(*row) for row in missing]
+        for start in range(0, len(rows), 1000):
+            insert_ignore(db, ComplaintTiming, rows[start:start + 1000])
+        db.commit()
+        added += len(missing)
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+    
+    session = SessionLocal()
+    try:
+        print(f"Added {backfill_timings(session)} complaint timings")
+    finally:
+        session.close()
@@ -1,103 +1,453 @@
+from sqlalchemy import Integer, case, cast, func, insert, literal, literal_column, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
-from typing import Dict, List
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import calendar
+from collections import Counter, defaultdict
 import json
+import time
+import numpy as np
+from app.config import settings
 from app.models.complaint import Complaint
-from app.models.organization import Organization
+from app.models.organization import Organization, OrganizationCounter
 from app.models.chat import Chat
+from app.utils.cache import TTLCache
+from app.utils.score_history import import_legacy_data_graphs, record_score_samples
 
-def update_organization_stats(organization_id: int, db: Session):
-    """Update organization statistics"""
-    organization = db.query(Organization).filter(Organization.id == organization_id).first()
-    if not organization:
-        return
+RESOLVED_STATES = ["resolved", "reimbursed"]
+
+def _epoch_seconds(db: Session, column):
+    """SQL expression for `column` as seconds since the epoch, ignoring the session time zone"""
+    if db.get_bind().dialect.name == "sqlite":
+        return cast(func.strftime("%s", column), Integer)
+    return func.timestampdiff(literal_column("SECOND"), literal("1970-01-01 00:00:00"), column)
+
+def _to_epoch(value: Optional[datetime]) -> int:
+    return calendar.timegm((value or datetime.utcnow()).timetuple())
+
+def _days_unresolved(unresolved: int, created_sum: int, now: int) -> int:
+    """
+    Whole days the unresolved complaints have been open, summed
     
-    # Get all complaints for this organization
-    complaints = db.query(Complaint).filter(Complaint.company_id == organization_id).all()
+    Derived from the sum of their creation times so the grouped aggregate
+    and the incrementally maintained counters give the same value.
+    """
+    return max(0, (unresolved * now - created_sum) // 86400)
+
+def aggregate_complaint_stats(db: Session, organization_ids: Optional[Iterable[int]] = None) -> Dict[int, Dict]:
+    """
+    Compute per-organization complaint counters with grouped queries
     
-    total_complaints = len(complaints)
-    resolved_complaints = len([c for c in complaints if c.state in ["resolved", "reimbursed"]])
-    unresolved_complaints = total_complaints - resolved_complaints
+    Returns {organization_id: {total, resolved, reimbursed, unresolved, days_unresolved,
+    unresolved_created_sum, chats}}
+    for every organization that has at least one complaint or chat.
+    """
+    now = _to_epoch(datetime.utcnow())
+    is_resolved = Complaint.state.in_(RESOLVED_STATES)
     
-    # Calculate score based on unresolved complaints and their age
-    today = datetime.utcnow()
-    total_days_unresolved = 0
+    complaint_query = db.query(
+        Complaint.company_id,
+        func.count(Complaint.id),
+        func.sum(case((is_resolved, 1), else_=0)),
+        func.sum(case((Complaint.state == "reimbursed", 1), else_=0)),
+        func.sum(case((is_resolved, 0), else_=_epoch_seconds(db, Complaint.created)))
+    ).group_by(Complaint.company_id)
     
-    for complaint in complaints:
-        if complaint.state not in ["resolved", "reimbursed"]:
-            days_old = (today - complaint.created).days
-            total_days_unresolved += days_old
+    chat_query = db.query(Chat.company_id, func.count(Chat.id)).group_by(Chat.company_id)
     
-    score = max(0, 100 - (unresolved_complaints + 0.25 * total_days_unresolved))
+    if organization_ids is not None:
+        organization_ids = list(organization_ids)
+        complaint_query = complaint_query.filter(Complaint.company_id.in_(organization_ids))
+        chat_query = chat_query.filter(Chat.company_id.in_(organization_ids))
     
-    # Get chat/reply count
-    chat_count = db.query(Chat).filter(Chat.company_id == organization_id).count()
+    aggregates = {}
+    for company_id, total, resolved, reimbursed, created_sum in complaint_query:
+        unresolved = total - int(resolved or 0)
+        aggregates[company_id] = {
+            "total": total,
+            "resolved": int(resolved or 0),
+            "reimbursed": int(reimbursed or 0),
+            "unresolved": unresolved,
+            "days_unresolved": _days_unresolved(unresolved, int(created_sum or 0), now),
+            "unresolved_created_sum": int(created_sum or 0),
+            "chats": 0
+        }
+    
+    for company_id, chat_count in chat_query:
+        aggregates.setdefault(company_id, _empty_aggregate())["chats"] = chat_count
+    
+    return aggregates
+
+def _empty_aggregate() -> Dict:
+    return {
+        "total": 0, "resolved": 0, "reimbursed": 0, "unresolved": 0,
+        "days_unresolved": 0, "unresolved_created_sum": 0, "chats": 0
+    }
+
+def _aggregate_from_counter(counter: OrganizationCounter) -> Dict:
+    """Derive the aggregate used by build_stats from maintained counters, without scanning rows"""
+    return {
+        "total": counter.complaints_total,
+        "resolved": counter.resolved,
+        "reimbursed": counter.reimbursed,
+        "unresolved": counter.unresolved,
+        "days_unresolved": _days_unresolved(
+            counter.unresolved, counter.unresolved_created_sum, _to_epoch(datetime.utcnow())
+        ),
+        "unresolved_created_sum": counter.unresolved_created_sum,
+        "chats": counter.chats
+    }
+
+def calculate_score(unresolved: int, days_unresolved: float) -> float:
+    """Score based on unresolved complaints and their age"""
+    return max(0, 100 - (unresolved + 0.25 * days_unresolved))
+
+def build_stats(stats: Optional[Dict], aggregate: Dict) -> Dict:
+    """Return a copy of `stats` refreshed from the counters in `aggregate`"""
+    stats = dict(stats or {})
+    total_complaints = aggregate["total"]
+    resolved_complaints = aggregate["resolved"]
+    chat_count = aggregate["chats"]
+    score = calculate_score(aggregate["unresolved"], aggregate["days_unresolved"])
     
-    # Update organization stats
-    stats = organization.stats or {}
     stats.update({
         "complaintsCounter": total_complaints,
         "score": round(score, 1),
         "replies": chat_count,
         "resolves": resolved_complaints,
-        "reimbursed": len([c for c in complaints if c.state == "reimbursed"]),
+        "reimbursed": aggregate["reimbursed"],
         "resolveRate": round((resolved_complaints / total_complaints * 100), 1) if total_complaints > 0 else 0,
         "responseRate": round((chat_count / total_complaints * 100), 1) if total_complaints > 0 else 0
     })
+    return stats
+
+def update_organization_stats(organization_id: int, db: Session):
+    """Update organization statistics"""
+    _lock_counters(db, [organization_id])
+    organization = db.query(Organization).filter(Organization.id == organization_id).first()
+    if not organization:
+        return
     
-    # Update data graphs
-    stats["dataGraph"] = update_data_graphs(score, stats.get("dataGraph", {}))
-    
+    aggregate = aggregate_complaint_stats(db, [organization_id]).get(organization_id, _empty_aggregate())
+    stats = build_stats(organization.stats, aggregate)
+    if "dataGraph" in stats:
+        import_legacy_data_graphs(db, {organization_id: stats.pop("dataGraph")})
     organization.stats = stats
+    record_score_samples(db, {organization_id: calculate_score(aggregate["unresolved"], aggregate["days_unresolved"])})
     db.commit()
 
-def update_data_graphs(score: float, current_graphs: Dict) -> Dict:
-    """Update the data graphs with current score"""
-    today = datetime.utcnow()
-    
-    # Initialize graphs if empty
-    if not current_graphs:
-        current_graphs = {
-            "day": [0.0] * 12,
-            "days": [0.0] * 31,
-            "month": [0.0] * 12,
-            "year": [0.0] * 12
-        }
+def recompute_organization_stats(
+    db: Session,
+    organization_ids: Optional[Iterable[int]] = None,
+    chunk_size: int = 500
+) -> int:
+    """
+    Bulk recompute stats for many organizations at once
+    
+    Counters come from a few grouped aggregate queries instead of loading
+    complaints per organization; the new stats are written back with one
+    batched UPDATE and one commit per chunk of organizations, and every
+    organization's score is appended to the score history.
+    
+    A chunk's counter rows are locked before it is aggregated, so complaint
+    and chat events wait for the chunk to commit and then apply their deltas
+    on top of it instead of being overwritten.
+    
+    Returns the number of organizations updated.
+    """
+    query = db.query(Organization.id).order_by(Organization.id)
+    if organization_ids is not None:
+        query = query.filter(Organization.id.in_(list(organization_ids)))
+    all_ids = [org_id for (org_id,) in query]
+    # Each chunk's aggregate must read a snapshot taken after its locks
+    db.commit()
     
-    # Update hourly data (12 2-hour periods)
-    hour_index = today.hour // 2
-    current_graphs["day"][hour_index] = score
-    
-    # Update daily data
-    day_index = today.day - 1
-    # Calculate average of hours up to current time
-    hours_data = current_graphs["day"][:hour_index + 1]
-    if hours_data:
-        current_graphs["days"][day_index] = round(sum(hours_data) / len(hours_data), 2)
-    
-    # Update monthly data
-    month_index = today.month - 1
-    # Calculate average of days up to current day
-    days_data = current_graphs["days"][:day_index + 1]
-    if days_data:
-        current_graphs["month"][month_index] = round(sum(days_data) / len(days_data), 2)
-    
-    # Update yearly data
-    year_index = (today.year - 2018) % 12
-    # Calculate average of months up to current month
-    months_data = current_graphs["month"][:month_index + 1]
-    if months_data:
-        current_graphs["year"][year_index] = round(sum(months_data) / len(months_data), 2)
-    
-    return current_graphs
+    updated = 0
+    for start in range(0, len(all_ids), chunk_size):
+        chunk_ids = all_ids[start:start + chunk_size]
+        existing_counters = _lock_counters(db, chunk_ids)
+        aggregates = aggregate_complaint_stats(db, chunk_ids)
+        current_stats = db.query(Organization.id, Organization.stats).filter(
+            Organization.id.in_(chunk_ids)
+        ).all()
+        if not current_stats:
+            continue
+        
+        org_ids = [org_id for org_id, _ in current_stats]
+        import_legacy_data_graphs(db, {
+            org_id: stats["dataGraph"] for org_id, stats in current_stats if "dataGraph" in (stats or {})
+        })
+        rows, scores = build_stats_batch(org_ids, [stats for _, stats in current_stats], aggregates)
+        if rows:
+            db.execute(update(Organization), rows)
+        _reconcile_counters(db, org_ids, aggregates, existing_counters)
+        record_score_samples(db, dict(zip(org_ids, scores.tolist())))
+        db.commit()
+        updated += len(rows)
+    
+    return updated
 
-def check_crisis_status(organization_id: int, db: Session):
-    """Check if organization is in crisis and update status"""
+def _stat_column(stats_list: List[Optional[Dict]], key: str) -> np.ndarray:
+    """Existing values of one stats field as a float array, NaN where missing"""
+    values = [(stats or {}).get(key) for stats in stats_list]
+    return np.array([np.nan if value is None else value for value in values], dtype=float)
+
+def build_stats_batch(
+    organization_ids: List[int],
+    stats_list: List[Optional[Dict]],
+    aggregates: Dict[int, Dict]
+) -> Tuple[List[Dict], np.ndarray]:
+    """
+    Vectorized build_stats over many organizations
+    
+    Counters are loaded into NumPy columns and the scores and rates are
+    computed in one shot. Returns the {"id", "stats"} rows of organizations
+    whose stats actually changed, for a bulk UPDATE, and the unrounded score
+    of every organization.
+    """
+    rows = [aggregates.get(org_id, _empty_aggregate()) for org_id in organization_ids]
+    
+    def column(key):
+        return np.array([row[key] for row in rows], dtype=float)
+    
+    total = column("total")
+    resolved = column("resolved")
+    reimbursed = column("reimbursed")
+    chats = column("chats")
+    
+    scores = np.maximum(0, 100 - (column("unresolved") + 0.25 * column("days_unresolved")))
+    rounded_scores = np.round(scores, 1)
+    safe_total = np.maximum(total, 1)
+    resolve_rate = np.where(total > 0, np.round(resolved / safe_total * 100, 1), 0)
+    response_rate = np.where(total > 0, np.round(chats / safe_total * 100, 1), 0)
+    
+    fields = {
+        "complaintsCounter": total,
+        "score": rounded_scores,
+        "replies": chats,
+        "resolves": resolved,
+        "reimbursed": reimbursed,
+        "resolveRate": resolve_rate,
+        "responseRate": response_rate
+    }
+    
+    # Rows still carrying a legacy dataGraph are rewritten to drop it
+    changed = np.array(["dataGraph" in (stats or {}) for stats in stats_list], dtype=bool)
+    for key, values in fields.items():
+        changed |= _stat_column(stats_list, key) != values
+    
+    integer_fields = {"complaintsCounter", "replies", "resolves", "reimbursed"}
+    changed_rows = np.flatnonzero(changed)
+    # Convert whole columns back to Python values at once rather than per cell
+    field_values = {
+        key: (values[changed_rows].astype(int) if key in integer_fields else values[changed_rows]).tolist()
+        for key, values in fields.items()
+    }
+    
+    updates = []
+    for position, index in enumerate(changed_rows):
+        stats = dict(stats_list[index] or {})
+        stats.pop("dataGraph", None)
+        for key in fields:
+            stats[key] = field_values[key][position]
+        updates.append({"id": organization_ids[index], "stats": stats})
+    return updates, scores
+
+def _counter_values(aggregate: Dict) -> Dict:
+    return {
+        "complaints_total": aggregate["total"],
+        "resolved": aggregate["resolved"],
+        "reimbursed": aggregate["reimbursed"],
+        "unresolved": aggregate["unresolved"],
+        "unresolved_created_sum": aggregate["unresolved_created_sum"],
+        "chats": aggregate["chats"]
+    }
+
+def _lock_counters(db: Session, organization_ids: List[int]) -> Set[int]:
+    """
+    Lock the counter rows of `organization_ids` until the next commit and
+    return the ids that have one
+    
+    Rows are locked in id order so concurrent passes can't deadlock. Event
+    handlers update the counter first, so once the locks are held every
+    event either committed already or waits for this transaction.
+    """
+    return {
+        org_id for (org_id,) in db.query(OrganizationCounter.organization_id).filter(
+            OrganizationCounter.organization_id.in_(organization_ids)
+        ).order_by(OrganizationCounter.organization_id).with_for_update()
+    }
+
+def _reconcile_counters(db: Session, organization_ids: List[int], aggregates: Dict[int, Dict], existing: Set[int]):
+    """
+    Overwrite the incremental counters of `organization_ids` with freshly
+    aggregated values; `existing` holds the ids locked by _lock_counters
+    """
+    rows = [
+        {"organization_id": org_id, **_counter_values(aggregates.get(org_id, _empty_aggregate()))}
+        for org_id in organization_ids
+    ]
+    updates = [row for row in rows if row["organization_id"] in existing]
+    inserts = [row for row in rows if row["organization_id"] not in existing]
+    if updates:
+        db.execute(update(OrganizationCounter), updates)
+    if inserts:
+        db.execute(insert(OrganizationCounter), inserts)
+
+def _get_counter(db: Session, organization_id: int) -> OrganizationCounter:
+    """
+    Load the counter row of an organization, seeding it from the complaint
+    and chat tables the first time it is needed
+    
+    The seed aggregate runs before any pending changes are flushed, so
+    callers must apply their own delta afterwards.
+    """
+    counter = db.get(OrganizationCounter, organization_id)
+    if counter is not None:
+        return counter
+    
+    aggregate = aggregate_complaint_stats(db, [organization_id]).get(organization_id, _empty_aggregate())
+    counter = OrganizationCounter(organization_id=organization_id, **_counter_values(aggregate))
+    try:
+        with db.begin_nested():
+            db.add(counter)
+    except IntegrityError:
+        # Another request seeded the row concurrently
+        counter = db.get(OrganizationCounter, organization_id, populate_existing=True)
+    return counter
+
+def apply_stats_delta(db: Session, organization_id: int, **deltas: int) -> Optional[OrganizationCounter]:
+    """
+    Adjust the counters of one organization by the given deltas and refresh
+    the derived fields of Organization.stats
+    
+    Deltas are applied as `column = column + delta` so concurrent events do
+    not overwrite each other. Must be called before the triggering change is
+    flushed. Does not commit.
+    """
+    counter = _get_counter(db, organization_id)
+    for column, delta in deltas.items():
+        if delta:
+            setattr(counter, column, getattr(OrganizationCounter, column) + delta)
+    db.flush()
+    db.refresh(counter)
+    
+    organization = db.get(Organization, organization_id)
+    if organization:
+        organization.stats = build_stats(organization.stats, _aggregate_from_counter(counter))
+        is_crisis = counter.unresolved >= crisis_threshold(db)
+        if is_crisis != bool(organization.is_crisis):
+            invalidate_crisis_feed()
+        organization.is_crisis = is_crisis
+    return counter
+
+def _state_contribution(state, created: Optional[datetime]) -> Dict[str, int]:
+    """Counter contribution of a single complaint in `state`"""
+    state = getattr(state, "value", state)
+    is_resolved = state in RESOLVED_STATES
+    return {
+        "resolved": int(is_resolved),
+        "reimbursed": int(state == "reimbursed"),
+        "unresolved": int(not is_resolved),
+        "unresolved_created_sum": 0 if is_resolved else _to_epoch(created)
+    }
+
+def _invalidate_if_crisis(db: Session, organization_id: int):
+    """Drop the crisis feed when a complaint of a crisis organization changes"""
+    organization = db.get(Organization, organization_id)
+    if organization and organization.is_crisis:
+        invalidate_crisis_feed()
+
+def record_complaint_created(complaint: Complaint, db: Session):
+    """Count a new complaint in its organization's stats"""
+    record_complaints_created([complaint], db)
+
+def record_complaints_created(complaints: Iterable[Complaint], db: Session):
+    """Count new complaints with a single stats and crisis update per organization"""
+    deltas = defaultdict(Counter)
+    for complaint in complaints:
+        if complaint.company_id is None:
+            continue
+        deltas[complaint.company_id]["complaints_total"] += 1
+        deltas[complaint.company_id].update(_state_contribution(complaint.state or "submitted", complaint.created))
+    
+    for organization_id, organization_deltas in deltas.items():
+        apply_stats_delta(db, organization_id, **organization_deltas)
+        _invalidate_if_crisis(db, organization_id)
+
+def record_chat_created(organization_id: int, db: Session):
+    """Count a new chat in its organization's stats"""
+    apply_stats_delta(db, organization_id, chats=1)
+
+_threshold_cache = TTLCache(settings.CRISIS_THRESHOLD_TTL, max_entries=1)
+
+# Crisis feed pages, shared by every user and dropped when the feed changes
+crisis_feed_cache = TTLCache(settings.CRISIS_FEED_TTL)
+
+def invalidate_crisis_feed():
+    crisis_feed_cache.clear()
+
+def crisis_threshold(db: Session) -> float:
+    """
+    Number of unresolved complaints that puts an organization in crisis
+    
+    The user count behind it is cached for CRISIS_THRESHOLD_TTL seconds so
+    callers do not count the users table on every event.
+    """
     from app.models.user import User
     
-    # Get total user count (for threshold calculation)
-    total_users = db.query(User).count()
-    threshold = total_users ** 0.4  # Same formula as original
+    def load():
+        # Get total user count (for threshold calculation)
+        total_users = db.query(func.count(User.id)).scalar()
+        return total_users ** 0.4  # Same formula as original
+    
+    return _threshold_cache.get("threshold", load)
+
+def classify_crisis_organizations(db: Session, chunk_size: int = 1000) -> Dict:
+    """
+    Recompute is_crisis for every organization in one pass
+    
+    Unresolved counts come from a single grouped query and only organizations
+    whose flag flips are updated, with one bulk UPDATE per direction and
+    chunk. Returns the threshold, the flipped ids and the pass duration.
+    """
+    started = time.monotonic()
+    threshold = crisis_threshold(db)
+    
+    unresolved = dict(
+        db.query(Complaint.company_id, func.count(Complaint.id)).filter(
+            ~Complaint.state.in_(RESOLVED_STATES)
+        ).group_by(Complaint.company_id).all()
+    )
+    
+    entered, left = [], []
+    for org_id, is_crisis in db.query(Organization.id, Organization.is_crisis):
+        should_be_crisis = unresolved.get(org_id, 0) >= threshold
+        if should_be_crisis and not is_crisis:
+            entered.append(org_id)
+        elif is_crisis and not should_be_crisis:
+            left.append(org_id)
+    
+    for org_ids, is_crisis in ((entered, True), (left, False)):
+        for start in range(0, len(org_ids), chunk_size):
+            db.query(Organization).filter(
+                Organization.id.in_(org_ids[start:start + chunk_size])
+            ).update({Organization.is_crisis: is_crisis}, synchronize_session=False)
+    db.commit()
+    if entered or left:
+        invalidate_crisis_feed()
+    
+    return {
+        "threshold": threshold,
+        "entered": entered,
+        "left": left,
+        "duration": time.monotonic() - started
+    }
+
+def check_crisis_status(organization_id: int, db: Session):
+    """Check if organization is in crisis and update status"""
+    threshold = crisis_threshold(db)
     
     # Get organization
     organization = db.query(Organization).filter(Organization.id == organization_id).first()
@@ -112,19 +462,24 @@ def check_crisis_status(organization_id: int, db: Session):
     
     # Update crisis status
     is_crisis = unresolved_complaints >= threshold
+    if is_crisis != bool(organization.is_crisis):
+        invalidate_crisis_feed()
     organization.is_crisis = is_crisis
     db.commit()
     
     return is_crisis
 
-def update_complaint_stats(complaint: Complaint, db: Session):
-    """Update stats when complaint state changes"""
-    if complaint.state in ["resolved", "reimbursed"]:
-        # Complaint was resolved - update organization stats positively
-        update_organization_stats(complaint.company_id, db)
-    else:
-        # Complaint is still unresolved or reopened
-        update_organization_stats(complaint.company_id, db)
-    
-    # Check crisis status
-    check_crisis_status(complaint.company_id, db)
\ No newline at end of file
+def update_complaint_stats(complaint: Complaint, db: Session, previous_state):
+    """
+    Update stats when complaint state changes
+    
+    Moves the complaint's contribution from `previous_state` to its current
+    state in O(1); the crisis flag is refreshed from the same counters.
+    """
+    before = _state_contribution(previous_state, complaint.created)
+    after = _state_contribution(complaint.state, complaint.created)
+    deltas = {key: after[key] - before[key] for key in after}
+    
+    if any(deltas.values()):
+        apply_stats_delta(db, complaint.company_id, **deltas)
+    _invalidate_if_crisis(db, complaint.company_id)
\ No newline at end of file
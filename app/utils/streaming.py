@@ -0,0 +1,81 @@
+"""
+Streaming response helpers for large listings
+"""
+import json
+import zlib
+from typing import Any, Callable, Iterator, List, Optional, Tuple, Type
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy.orm import Query, Session
+from app.database import SessionLocal
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+def wants_ndjson(request: Request, stream: int = 0) -> bool:
+    """Whether the client asked for NDJSON through `stream=1` or the Accept header"""
+    return bool(stream) or NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+def iter_ndjson(query: Query, schema: Type[BaseModel], chunk_size: int = 1000) -> Iterator[bytes]:
+    """Serialize the rows of `query` one JSON line at a time, fetching `chunk_size` rows per round trip"""
+    for row in query.yield_per(chunk_size):
+        yield schema.model_validate(row).model_dump_json().encode() + b"\n"
+
+def ndjson_response(
+    build_query: Callable[[Session], Query],
+    schema: Type[BaseModel],
+    chunk_size: int = 1000
+) -> StreamingResponse:
+    """
+    Stream a query as NDJSON with flat memory use
+    
+    The query runs on its own session with a server-side cursor, which lives
+    as long as the response body is being sent.
+    """
+    def generate():
+        db = SessionLocal()
+        try:
+            yield from iter_ndjson(build_query(db), schema, chunk_size)
+        finally:
+            db.close()
+    
+    return StreamingResponse(generate(), media_type=NDJSON_MEDIA_TYPE)
+
+def ndjson_pages_response(
+    load_page: Callable[[Session, Optional[str]], Tuple[List[Any], Optional[str]]]
+) -> StreamingResponse:
+    """
+    Stream a keyset-paginated listing as NDJSON
+    
+    `load_page(db, cursor)` returns one page of JSON-compatible items and the
+    cursor of the next one. Unlike a server-side cursor, this leaves the
+    session free for per-page batched lookups. The stream ends on an empty
+    page, a missing cursor, or a cursor that did not advance, so a listing
+    that keeps returning the same page can't loop forever.
+    """
+    def generate():
+        db = SessionLocal()
+        try:
+            cursor = None
+            while True:
+                items, next_cursor = load_page(db, cursor)
+                for item in items:
+                    yield json.dumps(jsonable_encoder(item)).encode() + b"\n"
+                if not items or not next_cursor or next_cursor == cursor:
+                    break
+                cursor = next_cursor
+                db.expunge_all()
+        finally:
+            db.close()
+    
+    return StreamingResponse(generate(), media_type=NDJSON_MEDIA_TYPE)
+
+def gzip_chunks(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """Gzip a stream of byte chunks incrementally"""
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
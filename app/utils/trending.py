@@ -0,0 +1,267 @@
+"""
+Trending hashtags over sliding windows, served from memory
+
+Hashtags of new complaints are counted in rings of time buckets per
+window (last hour, day and week), globally and per organization. Each
+ring keeps a running total so the top hashtags are read without touching
+the database. Memory is bounded: every bucket keeps at most
+TRENDING_MAX_TAGS hashtags and at most TRENDING_MAX_ORGANIZATIONS
+organizations are tracked, least recently updated first out.
+
+Complaints also add their hashtags to per-bucket rollup rows in the same
+transaction. Each worker counts the complaints it creates and rebuilds its
+counters from the rollups every TRENDING_SYNC_INTERVAL seconds, so workers
+converge on the same numbers without scanning complaints.
+"""
+import asyncio
+import calendar
+import heapq
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models.trending import HashtagRollup
+from app.utils.sql import upsert_increment
+
+# window: (bucket seconds, buckets)
+WINDOWS = {
+    "hour": (60, 60),
+    "day": (3600, 24),
+    "week": (3600, 24 * 7),
+}
+
+HASHTAG_MAX_LENGTH = 100
+
+def normalize_hashtag(tag) -> str:
+    return str(tag).strip().lstrip("#").lower()[:HASHTAG_MAX_LENGTH]
+
+def _tags(hashtags) -> set:
+    return {normalize_hashtag(tag) for tag in (hashtags or [])} - {""}
+
+def _bucket_widths() -> Dict[int, int]:
+    """Bucket width in seconds: number of buckets of the longest window using it"""
+    widths: Dict[int, int] = {}
+    for seconds, buckets in WINDOWS.values():
+        widths[seconds] = max(widths.get(seconds, 0), buckets)
+    return widths
+
+def _epoch(value: Optional[datetime]) -> float:
+    return calendar.timegm(value.timetuple()) if value else time.time()
+
+class _Ring:
+    """Hashtag counts in a ring of time buckets with a running total over the window"""
+
+    def __init__(self, bucket_seconds: int, buckets: int, max_tags: int):
+        self.bucket_seconds = bucket_seconds
+        self.max_tags = max_tags
+        self.counts: List[Counter] = [Counter() for _ in range(buckets)]
+        self.numbers: List[Optional[int]] = [None] * buckets
+        self.totals = Counter()
+
+    def _clear(self, slot: int):
+        self.totals.subtract(self.counts[slot])
+        for tag in [tag for tag, count in self.totals.items() if count <= 0]:
+            del self.totals[tag]
+        self.counts[slot] = Counter()
+        self.numbers[slot] = None
+
+    def expire(self, now: float):
+        oldest = int(now // self.bucket_seconds) - len(self.counts) + 1
+        for slot, number in enumerate(self.numbers):
+            if number is not None and number < oldest:
+                self._clear(slot)
+
+    def add(self, tags: Iterable[str], at: float, now: float, count: int = 1):
+        number = int(at // self.bucket_seconds)
+        if number <= int(now // self.bucket_seconds) - len(self.counts):
+            return
+        slot = number % len(self.counts)
+        if self.numbers[slot] != number:
+            self._clear(slot)
+            self.numbers[slot] = number
+        
+        bucket = self.counts[slot]
+        for tag in tags:
+            bucket[tag] += count
+            self.totals[tag] += count
+        
+        # Keep the bucket bounded by forgetting its rarest hashtags
+        if len(bucket) > self.max_tags:
+            for tag, count in bucket.most_common()[self.max_tags:]:
+                del bucket[tag]
+                self.totals[tag] -= count
+                if self.totals[tag] <= 0:
+                    del self.totals[tag]
+
+    def top(self, limit: int, now: float) -> List[Tuple[str, int]]:
+        self.expire(now)
+        return heapq.nsmallest(limit, self.totals.items(), key=lambda item: (-item[1], item[0]))
+
+class TrendingHashtags:
+    def __init__(self, max_tags: int, max_organizations: int):
+        self.max_tags = max_tags
+        self.max_organizations = max_organizations
+        self._lock = threading.Lock()
+        self._global = self._rings()
+        self._organizations: "OrderedDict[int, Dict[str, _Ring]]" = OrderedDict()
+        # Complaints recorded while a rebuild is running, replayed onto its result
+        self._pending: Optional[List[Tuple[set, Optional[int], float]]] = None
+
+    def _rings(self) -> Dict[str, _Ring]:
+        return {window: _Ring(seconds, buckets, self.max_tags) for window, (seconds, buckets) in WINDOWS.items()}
+
+    def _organization_rings(self, organization_id: int) -> Dict[str, _Ring]:
+        rings = self._organizations.get(organization_id)
+        if rings is None:
+            rings = self._organizations[organization_id] = self._rings()
+            if len(self._organizations) > self.max_organizations:
+                self._organizations.popitem(last=False)
+        else:
+            self._organizations.move_to_end(organization_id)
+        return rings
+
+    def _add(self, tags: Iterable[str], organization_id: Optional[int], at: float, now: float):
+        scopes = [self._global]
+        if organization_id is not None:
+            scopes.append(self._organization_rings(organization_id))
+        for rings in scopes:
+            for ring in rings.values():
+                ring.add(tags, at, now)
+
+    def record(self, hashtags, organization_id: Optional[int], created: Optional[datetime] = None):
+        """Count the hashtags of one complaint"""
+        tags = _tags(hashtags)
+        if not tags:
+            return
+        at, now = _epoch(created), time.time()
+        with self._lock:
+            self._add(tags, organization_id, at, now)
+            if self._pending is not None:
+                self._pending.append((tags, organization_id, at))
+
+    def load(self, bucket_seconds: int, bucket: int, organization_id: Optional[int], hashtag: str, count: int, now: float):
+        """Add a rollup count to the rings of `bucket_seconds` wide buckets"""
+        rings = self._global if organization_id is None else self._organization_rings(organization_id)
+        for ring in rings.values():
+            if ring.bucket_seconds == bucket_seconds:
+                ring.add([hashtag], bucket * bucket_seconds, now, count)
+
+    def top(self, window: str, limit: int, organization_id: Optional[int] = None) -> List[Tuple[str, int]]:
+        with self._lock:
+            if organization_id is None:
+                rings = self._global
+            else:
+                rings = self._organizations.get(organization_id)
+                if rings is None:
+                    return []
+            return rings[window].top(limit, time.time())
+
+    def begin_rebuild(self):
+        """Start keeping the complaints recorded from now on for `replace_with`"""
+        with self._lock:
+            self._pending = []
+
+    def replace_with(self, other: "TrendingHashtags"):
+        """
+        Take over the counters of `other`, built off to the side
+        
+        Complaints recorded since `begin_rebuild` are replayed onto them, so
+        none are lost; one committed just before the rollups were read may
+        be counted twice until the next rebuild.
+        """
+        with self._lock:
+            now = time.time()
+            for tags, organization_id, at in self._pending or []:
+                other._add(tags, organization_id, at, now)
+            self._global = other._global
+            self._organizations = other._organizations
+            self._pending = None
+
+trending_hashtags = TrendingHashtags(settings.TRENDING_MAX_TAGS, settings.TRENDING_MAX_ORGANIZATIONS)
+
+def rollup_rows(complaints: Iterable[Tuple[object, Optional[int]]], created: Optional[datetime] = None) -> List[Dict]:
+    """Rollup increments of (hashtags, organization_id) pairs created at `created` (now by default)"""
+    at = _epoch(created)
+    counts = Counter()
+    for hashtags, organization_id in complaints:
+        for tag in _tags(hashtags):
+            for seconds in _bucket_widths():
+                counts[(seconds, int(at // seconds), organization_id or 0, tag)] += 1
+    return [
+        {"bucket_seconds": seconds, "bucket": bucket, "organization_id": organization_id, "hashtag": tag, "count": count}
+        for (seconds, bucket, organization_id, tag), count in counts.items()
+    ]
+
+def store_hashtags(db: Session, complaints: Iterable[Tuple[object, Optional[int]]], created: Optional[datetime] = None):
+    """Add the hashtags of new complaints, given as (hashtags, organization_id), to the rollups. Does not commit."""
+    # Sorted so concurrent transactions lock the rollup rows in the same order
+    rows = sorted(rollup_rows(complaints, created), key=lambda row: (
+        row["bucket_seconds"], row["bucket"], row["organization_id"], row["hashtag"]
+    ))
+    upsert_increment(
+        db, HashtagRollup, rows,
+        ["bucket_seconds", "bucket", "organization_id", "hashtag"], ["count"]
+    )
+
+def rebuild_trending(db: Session, chunk_size: int = 5000):
+    """Rebuild the counters from the rollup rows of the buckets still within their windows"""
+    trending_hashtags.begin_rebuild()
+    now = time.time()
+    rebuilt = TrendingHashtags(trending_hashtags.max_tags, trending_hashtags.max_organizations)
+    for seconds, buckets in _bucket_widths().items():
+        oldest = int(now // seconds) - buckets + 1
+        in_window = (HashtagRollup.bucket_seconds == seconds, HashtagRollup.bucket >= oldest)
+        
+        # Most used first, so each bucket keeps its TRENDING_MAX_TAGS top hashtags and skips the rest
+        loaded = Counter()
+        totals = db.query(
+            HashtagRollup.bucket, HashtagRollup.hashtag, func.sum(HashtagRollup.count).label("total")
+        ).filter(*in_window).group_by(HashtagRollup.bucket, HashtagRollup.hashtag).order_by(
+            func.sum(HashtagRollup.count).desc()
+        )
+        for bucket, tag, total in totals.yield_per(chunk_size):
+            if loaded[(bucket, None)] < rebuilt.max_tags:
+                loaded[(bucket, None)] += 1
+                rebuilt.load(seconds, bucket, None, tag, int(total), now)
+        
+        rows = db.query(
+            HashtagRollup.bucket, HashtagRollup.organization_id, HashtagRollup.hashtag, HashtagRollup.count
+        ).filter(*in_window, HashtagRollup.organization_id != 0).order_by(HashtagRollup.count.desc())
+        for bucket, organization_id, tag, count in rows.yield_per(chunk_size):
+            if loaded[(bucket, organization_id)] < rebuilt.max_tags:
+                loaded[(bucket, organization_id)] += 1
+                rebuilt.load(seconds, bucket, organization_id, tag, count, now)
+    trending_hashtags.replace_with(rebuilt)
+
+def prune_hashtag_rollups(db: Session) -> int:
+    """Delete the rollup rows of buckets past their longest window; returns rows deleted. Does not commit."""
+    now = time.time()
+    deleted = 0
+    for seconds, buckets in _bucket_widths().items():
+        deleted += db.query(HashtagRollup).filter(
+            HashtagRollup.bucket_seconds == seconds,
+            HashtagRollup.bucket <= int(now // seconds) - buckets
+        ).delete(synchronize_session=False)
+    return deleted
+
+def _rebuild_trending():
+    db = SessionLocal()
+    try:
+        rebuild_trending(db)
+    finally:
+        db.close()
+
+async def keep_trending_in_sync():
+    """Rebuild the counters from the rollups on startup and then every TRENDING_SYNC_INTERVAL seconds"""
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            await loop.run_in_executor(None, _rebuild_trending)
+        except Exception as e:
+            print(f"Trending hashtags rebuild failed: {e}")
+        await asyncio.sleep(settings.TRENDING_SYNC_INTERVAL)
@@ -0,0 +1,15 @@
+import os
+
+# app.config reads every setting at import time; the tests only touch the
+# database, so the remaining settings get placeholders
+for name in [
+    "JWT_SECRET_KEY", "SMTP_HOST", "SMTP_USER", "SMTP_PASSWORD",
+    "AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "AWS_BUCKET_NAME", "S3_BUCKET_URL",
+    "STRIPE_SECRET_KEY", "STRIPE_PRODUCT_ID",
+    "GOOGLE_CLIENT_ID", "GOOGLE_CLIENT_SECRET", "FACEBOOK_CLIENT_ID", "FACEBOOK_CLIENT_SECRET",
+    "TWITTER_CLIENT_ID", "TWITTER_CLIENT_SECRET",
+]:
+    os.environ.setdefault(name, "test")
+os.environ.setdefault("SMTP_PORT", "25")
+os.environ.setdefault("AWS_REGION", "us-east-1")
+os.environ.setdefault("DATABASE_URL", "sqlite://")